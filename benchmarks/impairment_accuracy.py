@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+    End to end accuracy and scaling check on loopback:
+    N SessionSenders -> ImpairmentProxy -> SessionReflector.
+
+    Compares the delay and loss reported by twampStatistics with the
+    configured impairment and reports the aggregate reply rate over the
+    active window (first packet sent to last reply received; the senders'
+    wait for lost replies at the end is not included).
+
+    usage: python benchmarks/impairment_accuracy.py [senders] [count] [interval-msec]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from twampy.impairment import Impairment, ImpairmentProxy
+from twampy.sessionreflector import SessionReflector
+from twampy.sessionsender import SessionSender
+
+REFLECTOR_PORT = 20101
+PROXY_PORT = 20102
+SENDER_PORT = 21000
+
+DELAY = 5.0       # msec, each direction
+JITTER = 1.0      # msec
+LOSS = 0.02
+SEED = 4711
+
+
+def track_last_reply(sender, last):
+    """ record in 'last' when 'sender' accepts a reply """
+    receive = sender.receive
+
+    def tracked(wakeup):
+        count = sender.stats.count
+        done = receive(wakeup)
+        if sender.stats.count > count:
+            last[sender] = time.perf_counter()
+        return done
+    sender.receive = tracked
+
+
+def main():
+    senders = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    interval = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+
+    reflector = SessionReflector("127.0.0.1:%d" % REFLECTOR_PORT)
+    reflector.daemon = True
+    reflector.start()
+
+    proxy = ImpairmentProxy("127.0.0.1:%d" % PROXY_PORT, "127.0.0.1:%d" % REFLECTOR_PORT,
+                            Impairment(DELAY, JITTER, "uniform", LOSS),
+                            Impairment(DELAY, JITTER, "uniform", LOSS), SEED)
+    proxy.daemon = True
+    proxy.start()
+
+    threads = [SessionSender("127.0.0.1:%d" % (SENDER_PORT + i), "127.0.0.1:%d" % PROXY_PORT,
+                             count, interval, 0, 64, 0, False) for i in range(senders)]
+    last = {}
+    for sender in threads:
+        track_last_reply(sender, last)
+    start = time.perf_counter()
+    for sender in threads:
+        sender.start()
+    for sender in threads:
+        sender.join()
+    proxy.stop()
+    elapsed = max(last.values()) - start if last else 0.0
+
+    received = sum(sender.stats.count for sender in threads)
+    expected_loss = 100 * (1 - (1 - LOSS) ** 2)
+    print("%-12s %12s %12s" % ("", "configured", "measured"))
+    for sender in threads:
+        stats = sender.stats
+        if stats.count == 0:
+            print("sender %d: no replies" % threads.index(sender))
+            continue
+        print("%-12s %10.2fms %10.2fms" % ("outbound", DELAY, stats.sumOB / stats.count))
+        print("%-12s %10.2fms %10.2fms" % ("inbound", DELAY, stats.sumIB / stats.count))
+        print("%-12s %11.1f%% %11.1f%%" % ("loss", expected_loss, 100.0 * (count - stats.count) / count))
+    for name, impairment in (("outbound", proxy.outbound), ("inbound", proxy.inbound)):
+        print("proxy %-8s %d forwarded, %d lost, %d tail drops" % (name, impairment.forwarded, impairment.dropped, impairment.taildrops))
+    if elapsed > 0:
+        print("%d senders, %d replies in %.1fsec (%.0f replies/s)" % (senders, received, elapsed, received / elapsed))
+    else:
+        print("%d senders, no replies" % senders)
+
+
+if __name__ == "__main__":
+    main()
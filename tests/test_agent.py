@@ -0,0 +1,49 @@
+import io
+import os
+import stat
+
+import pytest
+
+from twampy.agent import TwampAgent
+
+
+@pytest.fixture
+def agent(tmp_path):
+    server = TwampAgent(str(tmp_path / "agent.sock"))
+    yield server
+    server.server_close()
+
+
+def test_socket_owner_only(agent):
+    assert stat.S_IMODE(os.stat(agent.path).st_mode) == 0o600
+
+
+@pytest.mark.parametrize("request_", [
+    [],
+    {},
+    {"far_end": 1},
+    {"far_end": "127.0.0.1:9", "count": "10"},
+    {"far_end": "127.0.0.1:9", "count": 0},
+    {"far_end": "127.0.0.1:9", "count": True},
+    {"far_end": "127.0.0.1:9", "interval": 50},
+    {"far_end": "127.0.0.1:9", "ttl": 129},
+    {"far_end": "127.0.0.1:9", "tos": 256},
+    {"far_end": "127.0.0.1:9", "padding": 1.5},
+    {"far_end": "127.0.0.1:9", "do_not_fragment": 1},
+    {"far_end": "127.0.0.1:9", "mode": "secure"},
+    {"far_end": "127.0.0.1:9", "mode": "encrypted"},
+    {"far_end": "127.0.0.1:9", "mode": "encrypted", "secret": 42},
+])
+def test_invalid_request(agent, request_):
+    with pytest.raises(ValueError):
+        agent.sender(request_, io.StringIO())
+    # a rejected request must not keep its local address busy
+    assert not agent.busy
+
+
+def test_valid_request(agent):
+    sender = agent.sender({"near_end": "127.0.0.1:0", "far_end": "127.0.0.1:9", "count": 5, "interval": 100}, io.StringIO())
+    try:
+        assert (sender.count, sender.interval) == (5, 0.1)
+    finally:
+        agent.release(sender)
\ No newline at end of file
@@ -0,0 +1,96 @@
+import struct
+
+from twampy.analyzer import twampAnalyzer
+from twampy.constants import TIMEOFFSET, ALLBITS
+
+SENDER = bytes([10, 0, 0, 1])
+REFLECTOR = bytes([10, 0, 0, 2])
+PORT = 862
+
+
+def ntp(t):
+    return struct.pack('!2I', int(TIMEOFFSET + t), int((t - int(t)) * ALLBITS))
+
+
+def frame(src, sport, dst, dport, payload):
+    udp = struct.pack('!HHHH', sport, dport, 8 + len(payload), 0) + payload
+    ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + len(udp), 0, 0, 64, 17, 0, src, dst) + udp
+    return bytes(12) + b'\x08\x00' + ip
+
+
+def exchange(t1=100.0, t2=100.010, t3=100.011, t4=100.021):
+    request = struct.pack('!L8sH', 0, ntp(t1), 0x3fff)
+    reply = struct.pack('!L8sHH8sL8sH', 0, ntp(t3), 0x0001, 0, ntp(t2), 0, ntp(t1), 0x3fff)
+    return [(t1, frame(SENDER, 20000, REFLECTOR, PORT, request)),
+            (t4, frame(REFLECTOR, PORT, SENDER, 20000, reply))]
+
+
+def pcap(records):
+    data = struct.pack('<IHHiIII', 0xa1b2c3d4, 2, 4, 0, 0, 65535, 1)
+    for ts, packet in records:
+        data += struct.pack('<IIII', int(ts), int(round((ts - int(ts)) * 1e6)), len(packet), len(packet)) + packet
+    return data
+
+
+def block(btype, body):
+    body += bytes(-len(body) % 4)
+    return struct.pack('<II', btype, 12 + len(body)) + body + struct.pack('<I', 12 + len(body))
+
+
+def pcapng(records, ifid=0):
+    data = block(0x0A0D0D0A, struct.pack('<IHHq', 0x1A2B3C4D, 1, 0, -1))
+    data += block(0x00000001, struct.pack('<HHI', 1, 0, 65535))
+    for ts, packet in records:
+        usec = int(round(ts * 1e6))
+        data += block(0x00000006, struct.pack('<IIIII', ifid, usec >> 32, usec & 0xffffffff, len(packet), len(packet)) + packet)
+    return data
+
+
+def analyze(tmp_path, data):
+    path = tmp_path / "capture"
+    path.write_bytes(data)
+    analyzer = twampAnalyzer([PORT])
+    analyzer.analyze(str(path))
+    return analyzer
+
+
+def only_flow(analyzer):
+    assert len(analyzer.flows) == 1
+    return next(iter(analyzer.flows.values()))
+
+
+def test_pcap(tmp_path):
+    analyzer = analyze(tmp_path, pcap(exchange()))
+    flow = only_flow(analyzer)
+    assert (flow.requests, flow.stats.count, analyzer.malformed) == (1, 1, 0)
+    assert abs(flow.stats.minRT - 20.0) < 0.01
+    assert abs(flow.stats.minOB - 10.0) < 0.01
+
+
+def test_pcapng(tmp_path):
+    flow = only_flow(analyze(tmp_path, pcapng(exchange())))
+    assert (flow.requests, flow.stats.count) == (1, 1)
+
+
+def test_runt_frames(tmp_path):
+    # runt frames at every layer are skipped, the rest is analyzed
+    records = exchange()
+    full = records[0][1]
+    runts = [(101.0, full[:n]) for n in (6, 13, 20, 40)]
+    analyzer = analyze(tmp_path, pcap(runts[:2] + records + runts[2:]))
+    flow = only_flow(analyzer)
+    assert flow.stats.count == 1
+    assert analyzer.packets == 6
+    assert analyzer.malformed == 4
+
+
+def test_undefined_interface(tmp_path):
+    data = pcapng(exchange()) + pcapng(exchange(200.0, 200.01, 200.011, 200.021), ifid=3)[28 + 20:]
+    analyzer = analyze(tmp_path, data)
+    assert only_flow(analyzer).stats.count == 1
+    assert analyzer.malformed == 2
+
+
+def test_empty_file(tmp_path):
+    analyzer = analyze(tmp_path, b'')
+    assert (analyzer.packets, analyzer.malformed, len(analyzer.flows)) == (0, 0, 0)
@@ -0,0 +1,177 @@
+import hashlib
+import hmac
+import os
+import socket
+import struct
+import threading
+
+import pytest
+
+pytest.importorskip("cryptography")
+
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+from twampy.constants import MODE_UNAUTHENTICATED, MODE_AUTHENTICATED, MODE_ENCRYPTED, HMAC_LEN
+from twampy.controlclient import ControlClient
+from twampy.crypto import TestSessionCrypto as testCrypto
+from twampy.sessionreflector import SessionReflector
+from twampy.sessionsender import SessionSender
+
+SECRET = b"customer-secret"
+SALT = bytes(range(16))
+COUNT = 1024
+
+
+def recv_exact(conn, length):
+    data = b''
+    while len(data) < length:
+        chunk = conn.recv(length - len(data))
+        if not chunk:
+            raise ConnectionError("closed")
+        data += chunk
+    return data
+
+
+class fakeServer(threading.Thread):
+    """
+    TWAMP server side of [RFC4656, 3.1] and [RFC5357, 3], written against
+    the RFC with plain cryptography primitives. Reflects the accepted test
+    session with a SessionReflector.
+    """
+
+    def __init__(self, modes=MODE_UNAUTHENTICATED | MODE_AUTHENTICATED | MODE_ENCRYPTED, secret=SECRET):
+        threading.Thread.__init__(self, daemon=True)
+        self.modes = modes
+        self.secret = secret
+        self.listener = socket.create_server(("127.0.0.1", 0))
+        self.port = self.listener.getsockname()[1]
+        self.reflector = None
+        self.error = None
+
+    def run(self):
+        conn, _ = self.listener.accept()
+        try:
+            self.serve(conn)
+        except Exception as e:
+            self.error = e
+        finally:
+            conn.close()
+            self.listener.close()
+            if self.reflector:
+                self.reflector.stop(None, None)
+
+    def serve(self, conn):
+        challenge = os.urandom(16)
+        conn.sendall(bytes(12) + struct.pack('!I', self.modes) + challenge + SALT + struct.pack('!I', COUNT) + bytes(12))
+
+        mode, keyid, token, client_iv = struct.unpack('!I80s64s16s', recv_exact(conn, 164))
+        self.mode, self.keyid = mode, keyid.rstrip(b'\0')
+        accept = 0
+        if mode != MODE_UNAUTHENTICATED:
+            key = hashlib.pbkdf2_hmac('sha1', self.secret, SALT, COUNT, 16)
+            plain = Cipher(algorithms.AES(key), modes.CBC(bytes(16))).decryptor().update(token)
+            self.aes_key, self.hmac_key = plain[16:32], plain[32:64]
+            accept = 0 if plain[:16] == challenge else 1
+        server_iv = os.urandom(16)
+        conn.sendall(bytes(15) + struct.pack('!B', accept) + server_iv + bytes(16))
+        if accept:
+            return
+
+        if mode != MODE_UNAUTHENTICATED:
+            decrypt = Cipher(algorithms.AES(self.aes_key), modes.CBC(client_iv)).decryptor().update
+            encrypt = Cipher(algorithms.AES(self.aes_key), modes.CBC(server_iv)).encryptor().update
+
+        def receive(length):
+            data = recv_exact(conn, length)
+            if mode != MODE_UNAUTHENTICATED:
+                data = decrypt(data)
+                mac = hmac.new(self.hmac_key, data[:-HMAC_LEN], hashlib.sha1).digest()[:HMAC_LEN]
+                assert mac == data[-HMAC_LEN:], "control message HMAC"
+            return data
+
+        def send(data):
+            if mode != MODE_UNAUTHENTICATED:
+                mac = hmac.new(self.hmac_key, data, hashlib.sha1).digest()[:HMAC_LEN]
+                data = encrypt(data + mac)
+            else:
+                data = data + bytes(HMAC_LEN)
+            conn.sendall(data)
+
+        request = receive(112)
+        assert request[0] == 5
+        self.sid = os.urandom(16)
+        crypto = None
+        if mode != MODE_UNAUTHENTICATED:
+            crypto = testCrypto(mode, self.aes_key, self.hmac_key, self.sid)
+        self.reflector = SessionReflector("127.0.0.1:0", crypto)
+        self.reflector.daemon = True
+        self.reflector.start()
+        send(struct.pack('!BBH16s12x', 0, 0, self.reflector.socket.getsockname()[1], self.sid))
+
+        assert receive(32)[0] == 2
+        send(bytes(16))
+        assert receive(32)[0] == 3
+
+
+def setup(mode, keyid=b'', secret=SECRET, **kwargs):
+    server = fakeServer(**kwargs)
+    server.start()
+    client = ControlClient("127.0.0.1", server.port, timeout=5)
+    return server, client, client.connectionSetup(mode, keyid, secret)
+
+
+@pytest.mark.parametrize("mode", [MODE_UNAUTHENTICATED, MODE_AUTHENTICATED, MODE_ENCRYPTED])
+def test_controller_roundtrip(mode):
+    server, client, accepted = setup(mode, b'probe-1')
+    try:
+        assert accepted
+        assert client.reqSession(s_port=0)
+        assert client.port == server.reflector.socket.getsockname()[1]
+        assert client.sid == server.sid
+        assert client.startSessions()
+
+        sender = SessionSender("127.0.0.1:0", "127.0.0.1:%d" % client.port, 5, 100, 0, 64, 0, False, client.testSessionCrypto())
+        sender.run()
+        client.stopSessions()
+    finally:
+        client.close()
+        server.join(5)
+
+    assert server.error is None
+    assert server.mode == mode
+    assert sender.stats.count == 5
+    assert server.reflector.reflected == 5
+    assert server.reflector.dropped == 0
+    if mode != MODE_UNAUTHENTICATED:
+        assert server.keyid == b'probe-1'
+        assert (server.aes_key, server.hmac_key) == (client.aes_key, client.hmac_key)
+
+
+def test_wrong_secret():
+    server, client, accepted = setup(MODE_ENCRYPTED, secret=b"wrong")
+    client.close()
+    server.join(5)
+    assert not accepted
+    assert server.error is None
+
+
+def test_mode_not_offered():
+    server, client, accepted = setup(MODE_ENCRYPTED, modes=MODE_UNAUTHENTICATED)
+    client.close()
+    server.join(5)
+    assert not accepted
+    assert client.testSessionCrypto() is None
+
+
+def test_tampered_control_message():
+    server, client, accepted = setup(MODE_AUTHENTICATED)
+    try:
+        assert accepted
+        # flip a bit of the encrypted <<Accept-Session>> on its way in
+        decrypt = client.crypto._decrypt
+        client.crypto._decrypt = lambda data: decrypt(bytes([data[0] ^ 1]) + data[1:])
+        with pytest.raises(ValueError):
+            client.reqSession(s_port=0)
+    finally:
+        client.close()
+        server.join(5)
\ No newline at end of file
@@ -0,0 +1,116 @@
+import hashlib
+import hmac
+import struct
+
+import pytest
+
+pytest.importorskip("cryptography")
+
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+from twampy.constants import MODE_AUTHENTICATED, MODE_ENCRYPTED, HMAC_LEN
+from twampy.crypto import TestSessionCrypto as testCrypto
+from twampy.sessionreflector import SessionReflector
+from twampy.sessionsender import SessionSender
+
+AES_KEY = bytes(range(16))
+HMAC_KEY = bytes(range(32, 64))
+SID = bytes(range(100, 116))
+MODES = [MODE_AUTHENTICATED, MODE_ENCRYPTED]
+
+
+def reference_keys():
+    test_key = Cipher(algorithms.AES(AES_KEY), modes.ECB()).encryptor().update(SID)
+    encryptor = Cipher(algorithms.AES(test_key), modes.CBC(SID)).encryptor()
+    return test_key, encryptor.update(HMAC_KEY) + encryptor.finalize()
+
+
+def sealed(mode, length):
+    crypto = testCrypto(mode, AES_KEY, HMAC_KEY, SID)
+    plain = bytes(range(1, length + 1))
+    buf = bytearray(plain + bytes(HMAC_LEN + 8))
+    crypto.seal(buf, length)
+    return crypto, plain, buf
+
+
+@pytest.mark.parametrize("mode", MODES)
+@pytest.mark.parametrize("length", [testCrypto.SENDER_LEN, testCrypto.REFLECTOR_LEN])
+def test_roundtrip(mode, length):
+    _, plain, buf = sealed(mode, length)
+    assert bytes(buf[:length]) != plain
+
+    receiver = testCrypto(mode, AES_KEY, HMAC_KEY, SID)
+    assert bytes(receiver.open(bytes(buf), length)[:length]) == plain
+
+
+@pytest.mark.parametrize("mode", MODES)
+@pytest.mark.parametrize("pos", [0, 20, testCrypto.SENDER_LEN, testCrypto.SENDER_LEN + HMAC_LEN - 1])
+def test_tampered(mode, pos):
+    crypto, _, buf = sealed(mode, testCrypto.SENDER_LEN)
+    buf[pos] ^= 0x01
+    assert crypto.open(bytes(buf), testCrypto.SENDER_LEN) is None
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_wrong_key(mode):
+    _, _, buf = sealed(mode, testCrypto.SENDER_LEN)
+    other = testCrypto(mode, AES_KEY, HMAC_KEY, bytes(16))
+    assert other.open(bytes(buf), testCrypto.SENDER_LEN) is None
+
+
+def test_short_packet():
+    crypto, _, buf = sealed(MODE_AUTHENTICATED, testCrypto.SENDER_LEN)
+    assert crypto.open(bytes(buf[:testCrypto.SENDER_LEN + HMAC_LEN - 1]), testCrypto.SENDER_LEN) is None
+
+
+def test_authenticated_layout():
+    # first block AES-ECB, the rest in the clear, HMAC over the plain text
+    length = testCrypto.SENDER_LEN
+    _, plain, buf = sealed(MODE_AUTHENTICATED, length)
+    test_key, test_hmac_key = reference_keys()
+
+    assert bytes(buf[0:16]) == Cipher(algorithms.AES(test_key), modes.ECB()).encryptor().update(plain[0:16])
+    assert bytes(buf[16:length]) == plain[16:]
+    assert bytes(buf[length:length + HMAC_LEN]) == hmac.new(test_hmac_key, plain, hashlib.sha1).digest()[:HMAC_LEN]
+
+
+def test_encrypted_layout():
+    # all protected blocks AES-CBC with IV=0, HMAC over the plain text
+    length = testCrypto.REFLECTOR_LEN
+    _, plain, buf = sealed(MODE_ENCRYPTED, length)
+    test_key, test_hmac_key = reference_keys()
+
+    encryptor = Cipher(algorithms.AES(test_key), modes.CBC(bytes(16))).encryptor()
+    assert bytes(buf[:length]) == encryptor.update(plain) + encryptor.finalize()
+    assert bytes(buf[length:length + HMAC_LEN]) == hmac.new(test_hmac_key, plain, hashlib.sha1).digest()[:HMAC_LEN]
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_sender_reflector_offsets(mode):
+    # sender packet -> reflector -> sender: sequence numbers and timestamps
+    # are found at the offsets of [RFC5357, 4.1.2 and 4.2.1]
+    crypto = testCrypto.from_secret(mode, "secret")
+    sender = SessionSender("127.0.0.1:0", "127.0.0.1:9", 1, 100, 0, 64, 0, False, crypto)
+    reflector = SessionReflector("127.0.0.1:0", crypto)
+    try:
+        sent = []
+        sender.sendto = lambda data, address: sent.append(bytes(data))
+        reflector.sendto = lambda data, address: sent.append(bytes(data))
+
+        sender.transmit(7, 1000.5)
+        request = sent.pop()
+        assert len(request) == crypto.SENDER_LEN + HMAC_LEN
+        plain = crypto.open(request, crypto.SENDER_LEN)
+        assert struct.unpack_from('!I', plain, 0)[0] == 7
+        assert struct.unpack_from('!H', plain, 24)[0] == 0x3fff
+
+        reflector.reflect(request, ("127.0.0.1", 12345), None)
+        reply = sent.pop()
+        assert len(reply) == crypto.REFLECTOR_LEN + HMAC_LEN
+        plain = crypto.open(reply, crypto.REFLECTOR_LEN)
+        rseq, sseq = struct.unpack_from('!I', plain, 0)[0], struct.unpack_from('!I', plain, 48)[0]
+        assert (rseq, sseq) == (0, 7)
+        assert bytes(plain[64:72]) == bytes(crypto.open(request, crypto.SENDER_LEN)[16:24])
+    finally:
+        sender.socket.close()
+        reflector.socket.close()
@@ -0,0 +1,83 @@
+import os
+import struct
+import time
+
+import pytest
+
+from twampy.constants import TIMEOFFSET
+from twampy.diagnostics import reflectorDiagnostics
+from twampy.sessionreflector import SessionReflector
+
+
+@pytest.fixture
+def reflector():
+    reflector = SessionReflector("127.0.0.1:0")
+    reflector.sendto = lambda data, address: None
+    yield reflector
+    reflector.socket.close()
+
+
+def request(sseq):
+    return struct.pack('!L2IH', sseq, int(TIMEOFFSET + time.time()), 0, 0x3fff) + bytes(27)
+
+
+def wait(diagnostics, timeout=5):
+    deadline = time.time() + timeout
+    while diagnostics.capturing and time.time() < deadline:
+        time.sleep(0.01)
+    assert not diagnostics.capturing
+
+
+def test_report(tmp_path, reflector):
+    reflector.reflect(request(0), ("127.0.0.1", 5000), None)
+    reflectorDiagnostics(reflector, str(tmp_path)).dump()
+    (report,) = tmp_path.iterdir()
+    text = report.read_text()
+    assert "packets reflected: 1" in text
+    assert "sessions:          1" in text
+    assert "Thread MainThread" in text
+
+
+def test_report_error_is_not_raised(tmp_path, reflector):
+    reflectorDiagnostics(reflector, str(tmp_path / "removed")).dump()
+
+
+def test_cprofile_without_traffic(tmp_path, reflector):
+    diagnostics = reflectorDiagnostics(reflector, str(tmp_path), seconds=0.1)
+    diagnostics.capture()
+    wait(diagnostics)
+    assert "reflect" not in reflector.__dict__
+    assert sorted(path.suffix for path in tmp_path.iterdir()) == [".prof", ".txt"]
+    diagnostics.capture()   # a new capture can be started
+    wait(diagnostics)
+
+
+def test_cprofile_with_traffic(tmp_path, reflector):
+    diagnostics = reflectorDiagnostics(reflector, str(tmp_path), seconds=0.2)
+    diagnostics.capture()
+    for sseq in range(5):
+        reflector.reflect(request(sseq), ("127.0.0.1", 5000), None)
+    wait(diagnostics)
+    reflector.reflect(request(5), ("127.0.0.1", 5000), None)
+    assert reflector.reflected == 6
+    (summary,) = tmp_path.glob("*.prof.txt")
+    text = summary.read_text()
+    assert text.startswith("5 packets")
+    assert "sessionreflector.py" in text
+
+
+def test_capture_error_is_not_raised(tmp_path, reflector):
+    diagnostics = reflectorDiagnostics(reflector, str(tmp_path / "removed"), seconds=0.1)
+    diagnostics.capture()
+    wait(diagnostics)
+    assert "reflect" not in reflector.__dict__
+
+
+def test_tracemalloc(tmp_path, reflector):
+    diagnostics = reflectorDiagnostics(reflector, str(tmp_path), "tracemalloc", seconds=0.1)
+    diagnostics.capture()
+    reflector.reflect(request(0), ("127.0.0.1", 5000), None)
+    wait(diagnostics)
+    (report,) = tmp_path.iterdir()
+    assert report.read_text().startswith("traced memory")
+    assert os.path.basename(str(report)).endswith(".malloc.txt")
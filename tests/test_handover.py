@@ -0,0 +1,70 @@
+import socket
+import struct
+import time
+
+import pytest
+
+from twampy.constants import TIMEOFFSET
+from twampy.sessionreflector import SessionReflector
+
+
+def request(sseq):
+    return struct.pack('!L2IH', sseq, int(TIMEOFFSET + time.time()), 0, 0x3fff) + bytes(27)
+
+
+@pytest.fixture
+def client():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.settimeout(2)
+    yield sock
+    sock.close()
+
+
+def rseq(client, port, sseq):
+    client.sendto(request(sseq), ("127.0.0.1", port))
+    return struct.unpack_from('!I', client.recv(9216), 0)[0]
+
+
+def start(reflector):
+    reflector.daemon = True
+    reflector.start()
+    return reflector
+
+
+@pytest.fixture
+def old(tmp_path):
+    reflector = start(SessionReflector("127.0.0.1:0", handover=str(tmp_path / "handover.sock")))
+    yield reflector
+    if reflector.is_alive():
+        reflector.stop(None, None)
+
+
+def test_stop_after_handover(tmp_path, old, client):
+    port = old.socket.getsockname()[1]
+    assert rseq(client, port, 0) == 0
+
+    path = str(tmp_path / "handover.sock")
+    new = SessionReflector("127.0.0.1:%d" % port, handover=path, takeover=path)
+    try:
+        old.join(2)
+        assert not old.is_alive()
+        # SIGINT to the old process must not shut the shared socket down
+        old.stop(None, None)
+
+        start(new)
+        assert rseq(client, port, 1) == 1
+        assert rseq(client, port, 2) == 2
+    finally:
+        new.stop(None, None)
+
+
+def test_takeover_other_near_end(tmp_path, old, client):
+    port = old.socket.getsockname()[1]
+    path = str(tmp_path / "handover.sock")
+    with pytest.raises(OSError, match="not 127.0.0.1:%d" % (port + 1)):
+        SessionReflector("127.0.0.1:%d" % (port + 1), handover=path, takeover=path)
+
+    # not acknowledged: the running reflector carries on
+    assert rseq(client, port, 0) == 0
+    assert old.is_alive() and not old.handed_over
\ No newline at end of file
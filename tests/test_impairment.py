@@ -0,0 +1,40 @@
+import random
+
+from twampy.impairment import Impairment
+
+
+def offer(impairment, packets, gap=0.00001, size=100):
+    rng = random.Random(1)
+    released = 0
+    for i in range(packets):
+        released += len(impairment.schedule(rng, i * gap, size))
+    return released
+
+
+def test_no_limit_without_rate():
+    # 2000 packets in flight at 50ms delay: nothing is tail dropped
+    impairment = Impairment(delay=50)
+    assert offer(impairment, 2000) == 2000
+    assert (impairment.dropped, impairment.taildrops) == (0, 0)
+
+
+def test_limit_with_rate():
+    # 8kbit/s link: every 100 byte packet takes 100ms, the queue overflows
+    impairment = Impairment(rate=8000, limit=10)
+    assert offer(impairment, 100) == 10
+    assert (impairment.dropped, impairment.taildrops) == (0, 90)
+
+
+def test_loss_counted_apart():
+    impairment = Impairment(loss=0.5, rate=8000, limit=10)
+    released = offer(impairment, 1000)
+    assert released == 10
+    assert impairment.dropped + impairment.taildrops + released == 1000
+    assert 400 < impairment.dropped < 600
+
+
+def test_rate_serializes():
+    impairment = Impairment(rate=8000)
+    rng = random.Random(1)
+    assert impairment.schedule(rng, 0, 100) == [0.1]
+    assert impairment.schedule(rng, 0, 100) == [0.2]
@@ -0,0 +1,101 @@
+import json
+import threading
+import time
+
+import pytest
+
+from twampy.results import resultSink, open_sink, parquetSink
+
+
+class stalledSink(resultSink):
+    """ sink whose writer hangs until released """
+
+    def __init__(self, path, **kwargs):
+        self.release = threading.Event()
+        self.records = []
+        resultSink.__init__(self, path, **kwargs)
+
+    def write(self, batch):
+        self.release.wait()
+        self.records.extend(batch)
+        return len(batch)
+
+
+def fill(sink, records):
+    start = time.perf_counter()
+    accepted = [sink.put({"sseq": i}) for i in range(records)]
+    return accepted, time.perf_counter() - start
+
+
+@pytest.mark.parametrize("policy", ["drop-newest", "drop-oldest"])
+def test_drop_policies_never_wait(policy):
+    sink = stalledSink("stalled", queue_size=10, batch_size=1, policy=policy)
+    _, elapsed = fill(sink, 1000)
+    assert elapsed < 0.5
+    assert sink.counters()["blocked"] == 0
+    sink.release.set()
+    counters = sink.close()
+    assert counters["written"] + counters["dropped"] == 1000
+    kept = [record["sseq"] for record in sink.records]
+    if policy == "drop-newest":
+        assert kept == list(range(len(kept)))
+    else:
+        assert kept[-10:] == list(range(990, 1000))
+
+
+def test_block_is_bounded_and_counted():
+    sink = stalledSink("stalled", queue_size=10, batch_size=1, policy="block", timeout=0.002)
+    accepted, elapsed = fill(sink, 50)
+    counters = sink.counters()
+    assert counters["timeouts"] == accepted.count(False) >= 38
+    assert counters["blocked"] >= counters["timeouts"]
+    assert elapsed < 50 * 0.002 + 0.5
+    sink.release.set()
+    assert sink.close()["dropped"] == counters["timeouts"]
+
+
+def test_close_is_bounded():
+    sink = stalledSink("stalled", queue_size=10, batch_size=1)
+    fill(sink, 20)
+    start = time.perf_counter()
+    counters = sink.close(timeout=0.2)
+    assert time.perf_counter() - start < 1.0
+    # one record is stuck in write(), the queued ones are abandoned
+    assert counters["written"] == 0
+    assert counters["dropped"] == 20 - 1
+    assert counters["queued"] == 1   # the close marker for a late recovery
+    sink.release.set()
+
+
+def test_jsonl(tmp_path):
+    path = tmp_path / "results.jsonl"
+    sink = open_sink(str(path))
+    for i in range(3):
+        sink.put({"type": "packet", "sseq": i})
+    assert sink.close()["written"] == 3
+    assert [json.loads(line)["sseq"] for line in path.read_text().splitlines()] == [0, 1, 2]
+
+
+def test_parquet(tmp_path):
+    pyarrow_parquet = pytest.importorskip("pyarrow.parquet")
+    path = tmp_path / "results.parquet"
+    sink = open_sink("parquet:%s" % path)
+    sink.put({"type": "summary", "sent": 10, "unreliable": True})
+    sink.close()
+    table = pyarrow_parquet.read_table(str(path))
+    assert table.column("sent").to_pylist() == [10]
+    assert table.column("unreliable").to_pylist() == [True]
+
+
+
+def test_parquet_counts_written_row_groups(tmp_path):
+    pytest.importorskip("pyarrow.parquet")
+    sink = parquetSink(str(tmp_path / "results.parquet"), row_group_size=4)
+    for i in range(3):
+        sink.put({"type": "packet", "sseq": i})
+    deadline = time.perf_counter() + 5
+    while len(sink.pending) < 3 and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    # buffered for the next row group, not written yet
+    assert sink.counters()["written"] == 0
+    assert sink.close()["written"] == 3
\ No newline at end of file
@@ -0,0 +1,36 @@
+import socket
+
+import pytest
+
+from twampy.sessionsender import MultiSessionSender
+
+CLASSES = [("be", 0x00), ("af41", 0x88), ("ef", 0xb8)]
+
+
+def test_classes_on_ephemeral_ports():
+    sender = MultiSessionSender("127.0.0.1:0", "127.0.0.1:9", 1, 100, CLASSES, 64, 0, False)
+    try:
+        ports = [s.socket.getsockname()[1] for s in sender.senders]
+        # ephemeral, not 0, 1, 2, ...
+        with open("/proc/sys/net/ipv4/ip_local_port_range") as f:
+            low = int(f.read().split()[0])
+        assert min(ports) >= low
+        assert len(set(ports)) == len(CLASSES)
+    finally:
+        for s in sender.senders:
+            s.socket.close()
+
+
+def test_bind_failure_closes_sockets():
+    blocker = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    blocker.bind(("127.0.0.1", 0))
+    try:
+        # the last class collides with the blocker
+        port = blocker.getsockname()[1] - (len(CLASSES) - 1)
+        with pytest.raises(OSError) as excinfo:
+            MultiSessionSender("127.0.0.1:%d" % port, "127.0.0.1:9", 1, 100, CLASSES, 64, 0, False)
+        multi = next(entry.frame.f_locals["self"] for entry in excinfo.traceback
+                     if isinstance(entry.frame.f_locals.get("self"), MultiSessionSender))
+        assert all(s.socket.fileno() == -1 for s in multi.senders)
+    finally:
+        blocker.close()
\ No newline at end of file
@@ -0,0 +1,58 @@
+import random
+
+import pytest
+
+from twampy.statistics import twampHistogram, hostStatistics
+
+
+def histogram(values):
+    hist = twampHistogram()
+    for ms in values:
+        hist.add(ms)
+    return hist
+
+
+def test_buckets_cover_all_values():
+    previous = 0
+    for us in list(range(5000)) + [2 ** 20 + 3, 2 ** 30 + 7, 2 ** 31 - 1]:
+        i = twampHistogram.index(us)
+        lower, upper = twampHistogram.edges(i)
+        assert lower <= us < upper
+        assert upper - lower <= max(1, lower / twampHistogram.SUB)
+        assert i >= previous
+        previous = i
+    assert twampHistogram.index(2 ** 40) == twampHistogram.BUCKETS - 1
+
+
+def test_percentile_within_bucket_width():
+    rng = random.Random(7)
+    values = sorted(rng.lognormvariate(-1, 1.5) for _ in range(10000))
+    hist = histogram(values)
+    for p in (50, 90, 99, 99.9):
+        exact = values[int(p * len(values) / 100) - 1]
+        assert hist.percentile(p) == pytest.approx(exact, rel=0.13, abs=0.002)
+        assert hist.lower_bound(p) <= exact + 0.001
+
+
+def test_outlier_does_not_inflate_p99():
+    hist = histogram([0.6] * 99 + [5.0])
+    assert hist.percentile(99) == pytest.approx(0.6, rel=0.125)
+    assert hist.percentile(100) == 5.0
+
+
+def test_unreliable():
+    host = hostStatistics(threshold=1.0)
+    for _ in range(99):
+        host.loop.add(0.6)
+    host.loop.add(5.0)
+    assert not host.unreliable()
+
+    for _ in range(10):
+        host.rxwait.add(1.2)
+    assert host.unreliable()
+    assert host.summary()["receive_wait_p99"] == pytest.approx(1.2, rel=0.125)
+
+
+def test_empty():
+    assert twampHistogram().percentile(99) == 0.0
+    assert not hostStatistics().unreliable()
@@ -7,7 +7,9 @@
 #    (TWAMP and TWAMP light) as defined in RFC5357.                          #
 #                                                                            #
 #  Features supported:                                                       #
-#    - unauthenticated mode                                                  #
+#    - unauthenticated, authenticated and encrypted mode (TWAMP-Control      #
+#      as in RFC5357; TWAMP light with keys derived from a shared secret     #
+#      as twampy extension)                                                  #
 #    - IPv4 and IPv6                                                         #
 #    - Support for DSCP, Padding, JumboFrames, IMIX                          #
 #    - Support to set DF flag (don't fragment)                               #
@@ -22,6 +24,14 @@
 #        same as TWAMP light                                                 #
 #    - TWAMP light Reflector                                                 #
 #        same as TWAMP light                                                 #
+#        (SIGUSR1: counters and thread stacks, SIGUSR2: profile capture)     #
+#    - TWAMP Agent                                                           #
+#        resident session sender, tests submitted over a Unix socket         #
+#    - Offline Analyzer                                                      #
+#        statistics per flow from pcap/pcapng captures of test traffic       #
+#    - Impairment Proxy                                                      #
+#        seedable delay, loss, reordering, duplication and rate limiting     #
+#        between session sender(s) and reflector                             #
 #                                                                            #
 #  Limitations:                                                              #
 #    As there is no hardware based timestamping, latency and jitter values   #
@@ -29,7 +39,6 @@
 #    DF flag implementation is currently not supported on OS X and FreeBSD.  #
 #                                                                            #
 #  Not yet supported:                                                        #
-#    - authenticated and encrypted mode                                      #
 #    - sending intervals variation                                           #
 #    - enhanced statistics                                                   #
 #       => bining and interim statistics                                     #
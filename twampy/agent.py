@@ -0,0 +1,153 @@
+import io
+import json
+import os
+import socket
+import socketserver
+import threading
+
+from twampy.constants import INTERVAL_DEFAULT, TTL_DEFAULT, TOS_DEFAULT, COUNT_DEFAULT, PADDING_DEFAULT, MODE_MAP, MODE_UNAUTHENTICATED
+from twampy.crypto import TestSessionCrypto
+from twampy.sessionsender import SessionSender
+from twampy.utils import parse_addr
+
+import logging
+logger = logging.getLogger("twampy")
+
+
+def _field(request, name, kind, default, low=None, high=None):
+    """ typed and range checked request field, like the click options of 'submit' """
+    value = request.get(name, default)
+    if value is None:
+        raise ValueError("'%s' is required" % name)
+    if not isinstance(value, kind) or (kind is int and isinstance(value, bool)):
+        raise ValueError("'%s' must be of type %s" % (name, kind.__name__))
+    if low is not None and not low <= value <= high:
+        raise ValueError("'%s' out of range [%d..%d]" % (name, low, high))
+    return value
+
+
+class agentHandler(socketserver.StreamRequestHandler):
+    """
+    One test per connection: the client sends the test parameters as a
+    single JSON line, the agent streams the twampStatistics output back.
+    """
+
+    def handle(self):
+        out = io.TextIOWrapper(self.wfile, encoding='utf-8', write_through=True)
+        try:
+            request = json.loads(self.rfile.readline())
+            sender = self.server.sender(request, out)
+        except (ValueError, KeyError, TypeError, OSError) as e:
+            logger.error("agent request rejected: %s", str(e))
+            out.write("error: %s\n" % str(e))
+            return
+
+        logger.info("agent test %s -> %s [count=%d]", request.get('near_end', ''), request['far_end'], sender.count)
+        try:
+            sender.run()
+        except OSError as e:
+            # the client went away, e.g. its output was a closed pipe
+            logger.warning("agent test result not delivered: %s", str(e))
+        finally:
+            self.server.release(sender)
+
+
+class TwampAgent(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Resident session sender. Bound UDP sockets, derived keys and imported
+    modules stay warm between tests; every test request arrives over a
+    Unix domain socket and runs in its own thread.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path):
+        if os.path.exists(path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+                raise OSError("agent already running on %s" % path)
+            except ConnectionRefusedError:
+                os.unlink(path)   # stale socket of a previous agent
+            finally:
+                probe.close()
+
+        socketserver.UnixStreamServer.__init__(self, path, agentHandler)
+        # tests run with the agent's privileges: owner only
+        os.chmod(path, 0o600)
+        self.path = path
+        self.lock = threading.Lock()
+        self.sockets = {}   # (near_end, ipversion, tos, ttl, df) -> idle UDP socket
+        self.busy = set()
+        logger.info("TWAMP agent listening on %s", path)
+
+    def sender(self, request, out):
+        if not isinstance(request, dict):
+            raise ValueError("request must be a JSON object")
+        near_end = _field(request, 'near_end', str, '')
+        far_end = _field(request, 'far_end', str, None)
+        count = _field(request, 'count', int, COUNT_DEFAULT, 1, 9999)
+        interval = _field(request, 'interval', int, INTERVAL_DEFAULT, 100, 1000)
+        tos = _field(request, 'tos', int, TOS_DEFAULT, 0, 255)
+        ttl = _field(request, 'ttl', int, TTL_DEFAULT, 1, 128)
+        padding = _field(request, 'padding', int, PADDING_DEFAULT, -1, 9000)
+        df = _field(request, 'do_not_fragment', bool, False)
+        mode = _field(request, 'mode', str, 'unauthenticated')
+        if mode not in MODE_MAP:
+            raise ValueError("'mode' must be one of %s" % ", ".join(MODE_MAP))
+        mode = MODE_MAP[mode]
+
+        crypto = None
+        if mode != MODE_UNAUTHENTICATED:
+            secret = _field(request, 'secret', str, None)
+            if not secret:
+                raise ValueError("'secret' is required in authenticated/encrypted mode")
+            crypto = TestSessionCrypto.from_secret(mode, secret)
+
+        ipversion = 6 if 6 in (parse_addr(near_end)[2], parse_addr(far_end)[2]) else 4
+        key = (near_end, ipversion, tos, ttl, df)
+        with self.lock:
+            if key in self.busy:
+                raise ValueError("local address %s busy with another test" % (near_end or '*'))
+            self.busy.add(key)
+            sock = self.sockets.pop(key, None)
+
+        if sock is not None:
+            self.drain(sock)
+
+        try:
+            sender = SessionSender(near_end, far_end, count, interval, tos, ttl, padding, df, crypto, sock, out)
+        except Exception:
+            with self.lock:
+                self.busy.discard(key)
+            raise
+        sender.agent_key = key
+        return sender
+
+    def release(self, sender):
+        with self.lock:
+            self.busy.discard(sender.agent_key)
+            self.sockets[sender.agent_key] = sender.socket
+
+    @staticmethod
+    def drain(sock):
+        """ drop late replies of the previous test """
+        sock.setblocking(False)
+        try:
+            while True:
+                sock.recv(9216)
+        except (BlockingIOError, InterruptedError):
+            pass
+        finally:
+            sock.setblocking(True)
+
+    def stop(self, signum=None, frame=None):
+        logger.info("Stop TWAMP agent")
+        threading.Thread(target=self.shutdown).start()
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        for sock in self.sockets.values():
+            sock.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
@@ -0,0 +1,90 @@
+import json
+import os
+import socket
+import sys
+
+from twampy.constants import DSCP_MAP, INTERVAL_DEFAULT, TTL_DEFAULT, TOS_DEFAULT, COUNT_DEFAULT, PADDING_DEFAULT, TWAMP_PORT_DEFAULT, MODE_MAP, MODE_UNAUTHENTICATED, AGENT_SOCKET_DEFAULT
+
+
+def connect(path, request):
+    """
+    Connect to the agent on 'path' and send the test request. Raises
+    OSError if the agent is not reachable.
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(path)
+        client.sendall(json.dumps(request).encode() + b'\n')
+    except OSError:
+        client.close()
+        raise
+    return client
+
+
+def submit(client, out=sys.stdout):
+    """
+    Thin client of the TWAMP agent, kept free of heavy imports: copy the
+    streamed result of the test submitted on 'client' (see connect) to
+    'out'. Returns the exit status (0: ok, 1: rejected by the agent).
+    """
+    try:
+        status = 0
+        for line in client.makefile('r', encoding='utf-8'):
+            if line.startswith("error: "):
+                sys.stderr.write(line)
+                status = 1
+                continue
+            out.write(line)
+            out.flush()
+        return status
+    finally:
+        client.close()
+
+
+def main(argv=None):
+    """
+    python -m twampy.agentclient: same arguments as 'cli.py submit', but
+    parsed with argparse, so a test starts without importing click.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m twampy.agentclient", description="Runs a sender test on a resident TWAMP agent")
+    parser.add_argument('near_end', metavar='local-ip:port', nargs='?', default=":%d" % TWAMP_PORT_DEFAULT)
+    parser.add_argument('far_end', metavar='remote-ip:port', nargs='?', default="127.0.0.1:%d" % TWAMP_PORT_DEFAULT)
+    parser.add_argument('-c', '--count', metavar='packets', type=int, default=COUNT_DEFAULT, help="[1..9999]")
+    parser.add_argument('-i', '--interval', metavar='msec', type=int, default=INTERVAL_DEFAULT, help="[100,1000]")
+    parser.add_argument('--tos', metavar='<type-of-service>', type=lambda value: int(value, 16), default=TOS_DEFAULT, help='IP TOS value in hex format. ex.: 0x88')
+    parser.add_argument('--dscp', metavar='<dscp-value>', choices=DSCP_MAP.keys(), default='be', help='IP DSCP value')
+    parser.add_argument('--ttl', metavar='<time-to-live>', type=int, choices=range(1, 129), default=TTL_DEFAULT, help='[1..128]')
+    parser.add_argument('--padding', metavar='<bytes>', type=int, default=PADDING_DEFAULT, help='IP/UDP packet size')
+    parser.add_argument('--do-not-fragment', action='store_true', help='Set do-not-fragment flag on IP packets')
+    parser.add_argument('--mode', choices=MODE_MAP.keys(), default='unauthenticated', help='TWAMP mode')
+    parser.add_argument('--secret', metavar='<shared-secret>', help='Shared secret for authenticated/encrypted mode (default: $TWAMPY_SECRET)')
+    parser.add_argument('-s', '--socket', dest='path', metavar='<path>', default=AGENT_SOCKET_DEFAULT, help='Unix domain socket of the agent')
+    args = parser.parse_args(argv)
+
+    secret = args.secret or os.environ.get("TWAMPY_SECRET")
+    if MODE_MAP[args.mode] != MODE_UNAUTHENTICATED and not secret:
+        parser.error("--secret is required in %s mode" % args.mode)
+
+    request = dict(near_end=args.near_end, far_end=args.far_end,
+                   count=min(max(args.count, 1), 9999), interval=min(max(args.interval, 100), 1000),
+                   tos=DSCP_MAP[args.dscp] << 2 if args.tos == TOS_DEFAULT else args.tos,
+                   ttl=args.ttl, padding=args.padding, do_not_fragment=args.do_not_fragment,
+                   mode=args.mode, secret=secret)
+    try:
+        client = connect(args.path, request)
+    except OSError as e:
+        sys.stderr.write("Error: agent not reachable on %s: %s\n" % (args.path, e))
+        return 1
+    try:
+        return submit(client)
+    except BrokenPipeError:
+        # output closed early (e.g. piped into head): not an agent error,
+        # keep the interpreter from complaining again when it flushes stdout
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+import socket
+import struct
+
+from collections import OrderedDict
+
+from twampy.constants import HMAC_LEN, TIMEOUT_DEFAULT, TIMEOFFSET, ALLBITS
+from twampy.pcap import captureFile
+from twampy.statistics import twampStatistics
+
+import logging
+logger = logging.getLogger("twampy")
+
+
+# link layer types [http://www.tcpdump.org/linktypes.html]
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+ETH_P_IP = 0x0800
+ETH_P_IPV6 = 0x86DD
+ETH_P_VLAN = (0x8100, 0x88a8, 0x9100)
+
+ETHERTYPE = struct.Struct('!H')
+UDP = struct.Struct('!HHH')
+NTP = struct.Struct('!2I')
+
+
+class twampFlow:
+
+    def __init__(self, sender, reflector):
+        self.sender = sender
+        self.reflector = reflector
+        self.stats = twampStatistics()
+        self.pending = OrderedDict()   # sseq -> capture time of the request
+        self.requests = 0
+        self.unmatched = 0
+        self.maxseq = -1
+
+    def total(self):
+        """ number of packets sent, as far as the capture tells """
+        return self.requests or self.maxseq + 1
+
+
+class twampAnalyzer:
+    """
+    Offline TWAMP-Test analysis of pcap/pcapng captures.
+
+    Sender packets (UDP destination port is a reflector port) and reflector
+    packets (UDP source port is a reflector port) are decoded using the
+    layouts of SessionSender and SessionReflector, replies are paired with
+    their requests by sender sequence number and fed into twampStatistics
+    per flow. Requests waiting longer than 'timeout' seconds for a reply are
+    dropped from the pairing table, so memory stays constant for captures
+    of any size.
+
+    t1, t2 and t3 come from the packets, t4 is the capture timestamp of the
+    reply: the capture must be taken on the session sender's host (and the
+    delays carry the capture clock's offset otherwise). Malformed records
+    are skipped and counted in 'malformed'.
+    """
+
+    def __init__(self, ports, crypto=None, timeout=TIMEOUT_DEFAULT):
+        self.ports = frozenset(ports)
+        self.crypto = crypto
+        self.timeout = timeout
+        self.flows = {}
+        self.packets = 0
+        self.malformed = 0
+
+        if crypto:
+            # offsets of rseq, t3, t2, sseq, t1 in a reflector packet [RFC5357, 4.2.1]
+            self.offsets = (0, 16, 32, 48, 64)
+            self.minlen = crypto.REFLECTOR_LEN + HMAC_LEN
+        else:
+            self.offsets = (0, 4, 16, 24, 28)
+            self.minlen = 36
+
+    def analyze(self, path):
+        capture = captureFile(path)
+        for ts, linktype, buf, off, caplen in capture:
+            self.packets += 1
+            if self.process(ts, linktype, buf, off, off + caplen) is False:
+                self.malformed += 1
+        self.malformed += capture.malformed
+
+    def process(self, ts, linktype, buf, pos, end):
+        """ returns False for packets too short for their headers """
+        # link layer
+        if linktype == LINKTYPE_ETHERNET:
+            if pos + 14 > end:
+                return False
+            ethertype = ETHERTYPE.unpack_from(buf, pos + 12)[0]
+            pos += 14
+            while ethertype in ETH_P_VLAN and pos + 4 <= end:
+                ethertype = ETHERTYPE.unpack_from(buf, pos + 2)[0]
+                pos += 4
+        elif linktype == LINKTYPE_LINUX_SLL:
+            if pos + 16 > end:
+                return False
+            ethertype = ETHERTYPE.unpack_from(buf, pos + 14)[0]
+            pos += 16
+        elif linktype == LINKTYPE_LINUX_SLL2:
+            if pos + 20 > end:
+                return False
+            ethertype = ETHERTYPE.unpack_from(buf, pos)[0]
+            pos += 20
+        elif linktype == LINKTYPE_NULL:
+            if pos + 4 > end:
+                return False
+            family = buf[pos] or buf[pos + 3]
+            ethertype = ETH_P_IP if family == 2 else ETH_P_IPV6
+            pos += 4
+        elif linktype in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6):
+            if pos >= end:
+                return False
+            ethertype = ETH_P_IP if buf[pos] >> 4 == 4 else ETH_P_IPV6
+        else:
+            return
+
+        # network layer
+        if ethertype == ETH_P_IP:
+            if pos + 20 > end or buf[pos] & 0x0f < 5:
+                return False
+            if buf[pos + 9] != 17:
+                return
+            if struct.unpack_from('!H', buf, pos + 6)[0] & 0x1fff:
+                return   # non-first fragment
+            src = buf[pos + 12:pos + 16]
+            dst = buf[pos + 16:pos + 20]
+            pos += (buf[pos] & 0x0f) * 4
+        elif ethertype == ETH_P_IPV6:
+            if pos + 40 > end:
+                return False
+            if buf[pos + 6] != 17:
+                return
+            src = buf[pos + 8:pos + 24]
+            dst = buf[pos + 24:pos + 40]
+            pos += 40
+        else:
+            return
+
+        # transport layer
+        if pos + 8 > end:
+            return False
+        sport, dport, length = UDP.unpack_from(buf, pos)
+        end = min(end, pos + length)
+        pos += 8
+
+        if dport in self.ports:
+            self.request(ts, (src, sport, dst, dport), buf, pos, end)
+        elif sport in self.ports:
+            self.reply(ts, (dst, dport, src, sport), buf, pos, end)
+
+    def flow(self, key):
+        flow = self.flows.get(key)
+        if flow is None:
+            flow = self.flows[key] = twampFlow((key[0], key[1]), (key[2], key[3]))
+        return flow
+
+    def request(self, ts, key, buf, pos, end):
+        if self.crypto:
+            data = self.crypto.open(buf[pos:end], self.crypto.SENDER_LEN)
+            if data is None:
+                return
+            sseq = struct.unpack_from('!I', data, 0)[0]
+        else:
+            if end - pos < 14:
+                return
+            sseq = struct.unpack_from('!I', buf, pos)[0]
+
+        flow = self.flow(key)
+        flow.maxseq = max(flow.maxseq, sseq)
+        flow.requests += 1
+        pending = flow.pending
+        pending.pop(sseq, None)
+        pending[sseq] = ts
+
+        # expire requests that will not get a reply any more
+        while pending and next(iter(pending.values())) < ts - self.timeout:
+            pending.popitem(last=False)
+
+    def reply(self, ts, key, buf, pos, end):
+        if end - pos < self.minlen:
+            return
+        if self.crypto:
+            data = self.crypto.open(buf[pos:end], self.crypto.REFLECTOR_LEN)
+            if data is None:
+                return
+            pos = 0
+        else:
+            data = buf
+
+        o_rseq, o_t3, o_t2, o_sseq, o_t1 = self.offsets
+        rseq = struct.unpack_from('!I', data, pos + o_rseq)[0]
+        sseq = struct.unpack_from('!I', data, pos + o_sseq)[0]
+
+        flow = self.flow(key)
+        if flow.requests and flow.pending.pop(sseq, None) is None:
+            # duplicate, late or unsolicited reply
+            flow.unmatched += 1
+            return
+        flow.maxseq = max(flow.maxseq, sseq)
+
+        t4 = ts
+        t3 = self.ntp(data, pos + o_t3)
+        t2 = self.ntp(data, pos + o_t2)
+        t1 = self.ntp(data, pos + o_t1)
+
+        delayRT = max(0, 1000 * (t4 - t1 + t2 - t3))  # round-trip delay
+        delayOB = max(0, 1000 * (t2 - t1))            # out-bound delay
+        delayIB = max(0, 1000 * (t4 - t3))            # in-bound delay
+        flow.stats.add(delayRT, delayOB, delayIB, rseq, sseq)
+
+    @staticmethod
+    def ntp(data, pos):
+        ta, tb = NTP.unpack_from(data, pos)
+        return ta - TIMEOFFSET + float(tb) / float(ALLBITS)
+
+    @staticmethod
+    def name(flow):
+        def addr(ip, port):
+            if len(ip) == 16:
+                return "[%s]:%d" % (socket.inet_ntop(socket.AF_INET6, ip), port)
+            return "%s:%d" % (socket.inet_ntop(socket.AF_INET, ip), port)
+        return "%s -> %s" % (addr(*flow.sender), addr(*flow.reflector))
@@ -0,0 +1 @@
+# subcommands of cli.py, imported on demand by its LazyGroup
\ No newline at end of file
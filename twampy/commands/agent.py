@@ -0,0 +1,48 @@
+import signal
+import sys
+
+import click
+
+from twampy.commands.options import twampy_params, ip_options, auth_options, agent_socket_option, tos_value
+from twampy.constants import MODE_MAP, MODE_UNAUTHENTICATED
+
+
+@click.command('agent')
+@agent_socket_option
+def agent(path):
+    """
+        Starts a resident TWAMP agent running tests on request
+    """
+    from twampy.agent import TwampAgent
+
+    server = TwampAgent(path)
+    signal.signal(signal.SIGINT, server.stop)
+    signal.signal(signal.SIGTERM, server.stop)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+@click.command('submit')
+@twampy_params
+@ip_options
+@auth_options
+@agent_socket_option
+def submit(near_end, far_end, count, interval, tos, dscp, ttl, padding, do_not_fragment, mode, secret, path):
+    """
+        Runs a sender test on a resident TWAMP agent
+    """
+    from twampy.agentclient import connect, submit as submit_test
+
+    if MODE_MAP[mode] != MODE_UNAUTHENTICATED and not secret:
+        raise click.BadParameter("--secret is required in %s mode" % mode)
+
+    request = dict(near_end=near_end, far_end=far_end, count=count, interval=interval,
+                   tos=tos_value(tos, dscp), ttl=ttl, padding=padding,
+                   do_not_fragment=do_not_fragment, mode=mode, secret=secret)
+    try:
+        client = connect(path, request)
+    except OSError as e:
+        raise click.ClickException("agent not reachable on %s: %s" % (path, e))
+    sys.exit(submit_test(client))
\ No newline at end of file
@@ -0,0 +1,29 @@
+import click
+
+from twampy.commands.options import auth_options, test_crypto
+from twampy.constants import TWAMP_PORT_DEFAULT
+
+import logging
+logger = logging.getLogger("twampy")
+
+
+@click.command('analyze')
+@click.argument('captures', metavar='capture-file', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('-p', '--port', 'ports', metavar='<udp-port>', multiple=True, type=int, default=[TWAMP_PORT_DEFAULT], show_default=True, help='UDP port of the session reflector (repeatable)')
+@auth_options
+def analyze(captures, ports, mode, secret):
+    """
+        Replays pcap/pcapng captures of TWAMP test traffic offline
+    """
+    from twampy.analyzer import twampAnalyzer
+
+    analyzer = twampAnalyzer(ports, test_crypto(mode, secret))
+    for capture in captures:
+        analyzer.analyze(capture)
+
+    logger.info("%d packets, %d TWAMP flows", analyzer.packets, len(analyzer.flows))
+    if analyzer.malformed:
+        logger.warning("%d malformed capture records skipped", analyzer.malformed)
+    for flow in analyzer.flows.values():
+        click.echo("Flow %s [%d requests, %d unmatched replies]" % (twampAnalyzer.name(flow), flow.requests, flow.unmatched))
+        flow.stats.dump(flow.total())
\ No newline at end of file
@@ -0,0 +1,64 @@
+import signal
+import time
+
+import click
+
+from twampy.commands.options import twampy_params, ip_options, control_auth_options, tos_value
+from twampy.constants import TWAMP_PORT_DEFAULT, MODE_MAP, MODE_UNAUTHENTICATED
+
+
+@click.command('controller')
+@twampy_params
+@ip_options
+@control_auth_options
+def controller(near_end, far_end, count, interval, tos, dscp, ttl, padding, do_not_fragment, mode, key_id, secret):
+    """
+        Starts a TWAMP Controller against a TWAMP server
+
+        Control Client and Session Sender: sets up a test session with
+        the server on remote-ip:port and sends from local-ip:port.
+    """
+    from twampy.controlclient import ControlClient
+    from twampy.sessionsender import SessionSender
+    from twampy.utils import parse_addr
+
+    if MODE_MAP[mode] != MODE_UNAUTHENTICATED and not secret:
+        raise click.BadParameter("--secret is required in %s mode" % mode)
+
+    sip, spt, sipv = parse_addr(near_end, 20000)
+    rip, rpt, ripv = parse_addr(far_end, TWAMP_PORT_DEFAULT)
+    tos = tos_value(tos, dscp)
+
+    try:
+        client = ControlClient(rip, rpt)
+    except OSError as e:
+        raise click.ClickException("TWAMP server %s not reachable: %s" % (far_end, e))
+
+    try:
+        if not client.connectionSetup(MODE_MAP[mode], key_id, secret):
+            raise click.ClickException("TWAMP-Control session refused by %s" % far_end)
+        ipversion = 6 if (sipv == 6) or (ripv == 6) else 4
+        if not client.reqSession(sender="::" if ipversion == 6 else "", s_port=spt, dscp=tos >> 2, padding=max(padding, 0)):
+            raise click.ClickException("test session refused by %s" % far_end)
+
+        reflector = "[%s]:%d" % (rip, client.port) if ipversion == 6 else "%s:%d" % (rip, client.port)
+        sender = SessionSender(near_end, reflector, count, interval, tos, ttl, padding, do_not_fragment, client.testSessionCrypto())
+        if not client.startSessions():
+            sender.socket.close()
+            raise click.ClickException("test session start refused by %s" % far_end)
+
+        sender.daemon = True
+        sender.name = "twl_sender"
+        sender.start()
+
+        signal.signal(signal.SIGINT, sender.stop)
+
+        while sender.is_alive():
+            time.sleep(0.1)
+
+        client.stopSessions()
+    except (OSError, ValueError) as e:
+        # ValueError: HMAC of a TWAMP-Control message did not verify
+        raise click.ClickException(str(e))
+    finally:
+        client.close()
\ No newline at end of file
@@ -0,0 +1,43 @@
+import signal
+import time
+
+import click
+
+from twampy.constants import TWAMP_PORT_DEFAULT, DISTRIBUTIONS
+
+
+@click.command('impair')
+@click.argument('near_end', metavar='local-ip:port', default=":20002")
+@click.argument('far_end', metavar='reflector-ip:port', default="127.0.0.1:%d" % TWAMP_PORT_DEFAULT)
+@click.option('--delay', metavar='msec', default=0.0, help='delay per direction')
+@click.option('--jitter', metavar='msec', default=0.0, help='delay variation per direction')
+@click.option('--distribution', type=click.Choice(DISTRIBUTIONS), default='constant', help='delay distribution')
+@click.option('--loss', metavar='percent', default=0.0, type=click.FloatRange(0, 100), help='packet loss')
+@click.option('--reorder', metavar='percent', default=0.0, type=click.FloatRange(0, 100), help='packets sent without delay')
+@click.option('--duplicate', metavar='percent', default=0.0, type=click.FloatRange(0, 100), help='packets sent twice')
+@click.option('--rate', metavar='bit/s', default=0, type=int, help='link rate (0: unlimited)')
+@click.option('--limit', metavar='packets', default=1000, type=int, help='queue limit of the rate limited link')
+@click.option('--direction', type=click.Choice(['both', 'outbound', 'inbound']), default='both', help='impaired direction(s)')
+@click.option('--seed', type=int, help='random seed for reproducible runs')
+def impair(near_end, far_end, delay, jitter, distribution, loss, reorder, duplicate, rate, limit, direction, seed):
+    """
+        Starts an impairment proxy between sender(s) and reflector
+    """
+    from twampy.impairment import ImpairmentProxy, Impairment
+
+    def impairment(enabled):
+        if not enabled:
+            return Impairment()
+        return Impairment(delay, jitter, distribution, loss / 100, reorder / 100, duplicate / 100, rate, limit)
+
+    proxy = ImpairmentProxy(near_end, far_end,
+                            impairment(direction in ('both', 'outbound')),
+                            impairment(direction in ('both', 'inbound')), seed)
+    proxy.daemon = True
+    proxy.name = "twl_impairment"
+    proxy.start()
+
+    signal.signal(signal.SIGINT, proxy.stop)
+
+    while proxy.is_alive():
+        time.sleep(0.1)
\ No newline at end of file
@@ -0,0 +1,132 @@
+import functools
+
+import click
+
+from twampy.constants import DSCP_MAP, INTERVAL_DEFAULT, TTL_DEFAULT, TOS_DEFAULT, COUNT_DEFAULT, PADDING_DEFAULT, TWAMP_PORT_DEFAULT, MODE_MAP, MODE_UNAUTHENTICATED, AGENT_SOCKET_DEFAULT
+
+
+class HexParamType(click.ParamType):
+    name = 'hex'
+
+    def convert(self, value, param, ctx):
+        try:
+            return int(value, 16)
+        except (ValueError, UnicodeError):
+            self.fail('%s is not valid hexadecimal' % value, param, ctx)
+
+    def __repr__(self):
+        return 'HEX'
+
+
+near_end_argument = click.argument(
+    'near_end', metavar='local-ip:port', default=":%d" % TWAMP_PORT_DEFAULT)
+count_option = click.option('-c', '--count', metavar='packets', default=COUNT_DEFAULT,
+                            type=click.IntRange(1, 9999, clamp=True), help="[1..9999]")
+
+
+def ip_options(func):
+    @click.option("--tos", metavar="<type-of-service>", default=str(TOS_DEFAULT), type=HexParamType(), help='IP TOS value in hex format. ex.: 0x88')
+    @click.option("--dscp", metavar="<dscp-value>", type=click.Choice(DSCP_MAP.keys()), default='be', help='IP DSCP value')
+    @click.option("--ttl", metavar="<time-to-live>", default=TTL_DEFAULT, type=click.IntRange(1, 128), help='[1..128]')
+    # TODO: CONFIRM THIS
+    @click.option("--padding", metavar="<bytes>", default=PADDING_DEFAULT, type=int, help='IP/UDP packet size')
+    @click.option("--do-not-fragment",  is_flag=True, help='Set do-not-fragment flag on IP packets')
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def auth_options(func):
+    # TWAMP light has no control session: keys come from the shared secret
+    @click.option("--mode", metavar="<mode>", type=click.Choice(MODE_MAP.keys()), default='unauthenticated', help='Test packet protection, keys derived from --secret (twampy extension, only between twampy ends)')
+    @click.option("--secret", metavar="<shared-secret>", envvar="TWAMPY_SECRET", help='Shared secret for authenticated/encrypted mode')
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def control_auth_options(func):
+    @click.option("--mode", metavar="<mode>", type=click.Choice(MODE_MAP.keys()), default='unauthenticated', help='TWAMP-Control mode [RFC5357]')
+    @click.option("--key-id", metavar="<key-id>", default='', help='KeyID of the shared secret on the server')
+    @click.option("--secret", metavar="<shared-secret>", envvar="TWAMPY_SECRET", help='Shared secret for authenticated/encrypted mode')
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def sink_options(func):
+    @click.option("--sink", "sinks", metavar="[jsonl|csv|parquet:]<file>", multiple=True, help='Write results to file (repeatable)')
+    @click.option("--sink-policy", type=click.Choice(['block', 'drop-newest', 'drop-oldest']), default='drop-newest', show_default=True, help='What to do when a sink falls behind (block: wait up to --sink-timeout, delaying the measurement)')
+    @click.option("--sink-queue", metavar="<records>", default=10000, type=click.IntRange(1), help='Queue size of each sink')
+    @click.option("--sink-timeout", metavar="msec", default=5.0, type=click.FloatRange(0), show_default=True, help='Longest wait per record with --sink-policy block')
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def open_sinks(sinks, policy, queue_size, timeout):
+    if not sinks:
+        return ()
+    from twampy.results import open_sink
+    try:
+        return [open_sink(spec, queue_size=queue_size, policy=policy, timeout=timeout / 1000) for spec in sinks]
+    except (ValueError, RuntimeError, OSError) as e:
+        raise click.BadParameter(str(e), param_hint="--sink")
+
+
+overhead_option = click.option("--overhead-threshold", metavar="msec", default=1.0, type=click.FloatRange(0), show_default=True, help='Flag the run unreliable above this host overhead (P99)')
+
+
+def test_crypto(mode, secret):
+    if MODE_MAP[mode] == MODE_UNAUTHENTICATED:
+        return None
+    if not secret:
+        raise click.BadParameter("--secret is required in %s mode" % mode)
+    from twampy.crypto import TestSessionCrypto
+    return TestSessionCrypto.from_secret(MODE_MAP[mode], secret)
+
+
+class ClassListParamType(click.ParamType):
+    name = 'classes'
+
+    def convert(self, value, param, ctx):
+        if isinstance(value, list):
+            return value
+        classes = []
+        for item in value.split(','):
+            item = item.strip().lower()
+            if item in DSCP_MAP:
+                classes.append((item, DSCP_MAP[item] << 2))
+                continue
+            try:
+                tos = int(item, 16)
+            except ValueError:
+                self.fail('%s is neither a DSCP name nor a hexadecimal TOS value' % item, param, ctx)
+            if not 0 <= tos <= 0xff:
+                self.fail('TOS value %s out of range' % item, param, ctx)
+            classes.append(("0x%02x" % tos, tos))
+        return classes
+
+
+def tos_value(tos, dscp):
+    if tos == TOS_DEFAULT:
+        return DSCP_MAP[dscp] << 2
+    return tos
+
+
+def twampy_params(func):
+    @near_end_argument
+    @click.argument('far_end', metavar='remote-ip:port', default="127.0.0.1:%d" % TWAMP_PORT_DEFAULT)
+    @count_option
+    @click.option('-i', '--interval', metavar='msec', default=INTERVAL_DEFAULT,  type=click.IntRange(100, 1000, clamp=True), help="[100,1000]")
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return func(*args, **kwargs)
+    return wrapper
+
+
+agent_socket_option = click.option('-s', '--socket', 'path', metavar='<path>', default=AGENT_SOCKET_DEFAULT, show_default=True, help='Unix domain socket of the agent')
\ No newline at end of file
@@ -0,0 +1,46 @@
+import signal
+import time
+
+import click
+
+from twampy.commands.options import near_end_argument, auth_options, overhead_option, test_crypto
+
+
+@click.command('reflector')
+@near_end_argument
+@auth_options
+@overhead_option
+@click.option("--handover", metavar="<path>", type=click.Path(dir_okay=False), help='Unix socket to hand this reflector over to a new process')
+@click.option("--takeover", is_flag=True, help='Take over socket and sessions of the reflector on --handover')
+@click.option("--diag-dir", metavar="<dir>", default=".", type=click.Path(file_okay=False, writable=True), show_default=True, help='Where SIGUSR1/SIGUSR2 diagnostics are written')
+@click.option("--diag-profiler", type=click.Choice(['cprofile', 'tracemalloc']), default='cprofile', show_default=True, help='Capture started by SIGUSR2')
+@click.option("--diag-seconds", metavar="<sec>", default=10, type=click.IntRange(1), show_default=True, help='Duration of the SIGUSR2 capture')
+def reflector(near_end, mode, secret, overhead_threshold, handover, takeover, diag_dir, diag_profiler, diag_seconds):
+    """
+        Starts a TWAMP lite Session Reflector
+    """
+    from twampy.sessionreflector import SessionReflector
+
+    if takeover and not handover:
+        raise click.BadParameter("--takeover requires --handover", param_hint="--takeover")
+
+    crypto = test_crypto(mode, secret)
+    try:
+        reflector = SessionReflector(near_end, crypto, overhead_threshold, handover, handover if takeover else None)
+    except OSError as e:
+        # never fall back to a fresh reflector: with SO_REUSEADDR it would
+        # share the port with the one still running and split its sessions
+        if takeover:
+            raise click.ClickException("takeover from %s failed: %s" % (handover, e))
+        raise click.ClickException(str(e))
+    reflector.daemon = True
+    reflector.name = "twl_reflector"
+    reflector.start()
+
+    signal.signal(signal.SIGINT, reflector.stop)
+    if hasattr(signal, 'SIGUSR1'):
+        from twampy.diagnostics import reflectorDiagnostics
+        reflectorDiagnostics(reflector, diag_dir, diag_profiler, diag_seconds).install()
+
+    while reflector.is_alive():
+        time.sleep(0.1)
\ No newline at end of file
@@ -0,0 +1,44 @@
+import signal
+import time
+
+import click
+from click.core import ParameterSource
+
+from twampy.commands.options import twampy_params, ip_options, auth_options, sink_options, overhead_option, ClassListParamType, tos_value, test_crypto, open_sinks
+
+
+@click.command('sender')
+@twampy_params
+@ip_options
+@auth_options
+@sink_options
+@overhead_option
+@click.option("--classes", metavar="<dscp|tos>,...", type=ClassListParamType(), help='Probe several traffic classes in parallel, ex.: be,af41,ef or 0x00,0xb8 (one local port per class, replaces --tos/--dscp)')
+def sender(near_end, far_end, count, interval, tos, dscp, ttl, padding, do_not_fragment, mode, secret, sinks, sink_policy, sink_queue, sink_timeout, overhead_threshold, classes):
+    """
+        Starts a TWAMP light Session Sender
+    """
+    from twampy.sessionsender import SessionSender, MultiSessionSender
+
+    ctx = click.get_current_context()
+    if classes and any(ctx.get_parameter_source(name) != ParameterSource.DEFAULT for name in ('tos', 'dscp')):
+        raise click.UsageError("--classes sets the TOS of every class, it can not be combined with --tos/--dscp")
+
+    tos = tos_value(tos, dscp)
+    crypto = test_crypto(mode, secret)
+    sinks = open_sinks(sinks, sink_policy, sink_queue, sink_timeout)
+    if classes:
+        sender = MultiSessionSender(near_end, far_end, count, interval, classes, ttl, padding, do_not_fragment, crypto, sinks=sinks, overhead_threshold=overhead_threshold)
+    else:
+        sender = SessionSender(near_end, far_end, count, interval, tos, ttl, padding, do_not_fragment, crypto, sinks=sinks, overhead_threshold=overhead_threshold)
+    sender.daemon = True
+    sender.name = "twl_sender"
+    sender.start()
+
+    signal.signal(signal.SIGINT, sender.stop)
+
+    while sender.is_alive():
+        time.sleep(0.1)
+
+    for sink in sinks:
+        sink.close()
\ No newline at end of file
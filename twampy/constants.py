@@ -84,6 +84,22 @@ DSCP_MAP = {"be":   0, "cp1":   1,  "cp2":  2,  "cp3":  3, "cp4":   4, "cp5":
             "nc1": 48, "cp49": 49, "cp50": 50, "cp51": 51, "cp52": 52, "cp53": 53, "cp54": 54, "cp55": 55,
             "nc2": 56, "cp57": 57, "cp58": 58, "cp59": 59, "cp60": 60, "cp61": 61, "cp62": 62, "cp63": 63}
 
+### TWAMP modes [RFC4656, RFC5357]
+MODE_UNAUTHENTICATED = 1
+MODE_AUTHENTICATED = 2
+MODE_ENCRYPTED = 4
+
+MODE_MAP = {"unauthenticated": MODE_UNAUTHENTICATED,
+            "authenticated":   MODE_AUTHENTICATED,
+            "encrypted":       MODE_ENCRYPTED}
+
+HMAC_LEN = 16          # HMAC-SHA1 truncated to 128 bits
+KDF_COUNT_DEFAULT = 1024
+KDF_SALT_LIGHT = b"twampy-light-kdf"   # TWAMP light key derivation (twampy extension)
+
+### Impairment proxy
+DISTRIBUTIONS = ("constant", "uniform", "normal", "exponential", "pareto")
+
 ### Defaults
 TIMEOUT_DEFAULT = 30
 
@@ -98,5 +114,7 @@ COUNT_DEFAULT = 100
 
 TWAMP_PORT_DEFAULT = 862
 
+AGENT_SOCKET_DEFAULT = "/tmp/twampy-agent.sock"
+
 NEAR_END_DEFAULT = ":862"
 FAR_END_DEFAULT = "127.0.0.1:862"
\ No newline at end of file
@@ -1,9 +1,11 @@
 import binascii
+import os
 import socket
 import struct
 
+from twampy.crypto import ControlSessionCrypto, TestSessionCrypto, derive_key, make_token
 from twampy.utils import generate_zero_bytes, now
-from twampy.constants import TIMEOFFSET, TWAMP_PORT_DEFAULT, TOS_DEFAULT, TIMEOUT_DEFAULT
+from twampy.constants import TIMEOFFSET, TWAMP_PORT_DEFAULT, TOS_DEFAULT, TIMEOUT_DEFAULT, MODE_UNAUTHENTICATED, MODE_MAP
 
 import logging
 logger = logging.getLogger("twampy")
@@ -13,8 +15,9 @@ class ControlClient:
 
     
     def __init__(self, server, port=TWAMP_PORT_DEFAULT, timeout=TIMEOUT_DEFAULT, tos=TOS_DEFAULT, source_address=None):
-        self.socket = socket.create_connection((server,tcp_port), timeout, source_address)
-        pass
+        self.socket = socket.create_connection((server, port), timeout, source_address)
+        self.mode = MODE_UNAUTHENTICATED
+        self.crypto = None
 
     def connect(self):
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -24,42 +27,80 @@ class ControlClient:
 
     def send(self, data):
         logger.debug("CTRL.TX %s", binascii.hexlify(data))
+        if self.crypto:
+            data = self.crypto.seal(data)
         try:
-            self.socket.send(data)
+            self.socket.sendall(data)
         except Exception as e:
             logger.critical('*** Sending data failed: %s', str(e))
 
-    def receive(self):
-        data = self.socket.recv(9216)
+    def receive(self, length):
+        """
+        Read one TWAMP-Control message of 'length' bytes (decrypted and
+        verified after <<Server-Start>> in authenticated/encrypted mode)
+        """
+        data = b''
+        while len(data) < length:
+            chunk = self.socket.recv(length - len(data))
+            if not chunk:
+                raise ConnectionError("TWAMP-Control connection closed by server")
+            data += chunk
+        if self.crypto:
+            data = self.crypto.open(data)
         logger.debug("CTRL.RX %s (%d bytes)", binascii.hexlify(data), len(data))
         return data
 
     def close(self):
         self.socket.close()
 
-    def connectionSetup(self):
+    def connectionSetup(self, mode=MODE_UNAUTHENTICATED, keyid=b'', secret=None):
         logger.info("CTRL.RX <<Server Greeting>>")
-        data = self.receive()
+        data = self.receive(64)
         self.smode = struct.unpack('!I', data[12:16])[0]
         logger.info("TWAMP modes supported: %d", self.smode)
-        if self.smode & 1 == 0:
-            logger.critical('*** TWAMPY only supports unauthenticated mode(1)')
+        if self.smode & mode == 0:
+            logger.critical('*** TWAMP mode(%d) not supported by server', mode)
+            return False
 
         logger.info("CTRL.TX <<Setup Response>>")
-        self.send(struct.pack('!I', 1) + generate_zero_bytes(160))
+        if mode == MODE_UNAUTHENTICATED:
+            self.send(struct.pack('!I', mode) + generate_zero_bytes(160))
+        else:
+            challenge = data[16:32]
+            salt = data[32:48]
+            count = struct.unpack('!I', data[48:52])[0]
+
+            # Session-keys are chosen by the client, once per control session
+            self.aes_key = os.urandom(16)
+            self.hmac_key = os.urandom(32)
+            client_iv = os.urandom(16)
+            if isinstance(keyid, str):
+                keyid = keyid.encode()
+            token = make_token(derive_key(secret, salt, count), challenge, self.aes_key, self.hmac_key)
+            self.send(struct.pack('!I80s64s16s', mode, keyid, token, client_iv))
 
         logger.info("CTRL.RX <<Server Start>>")
-        data = self.receive()
+        data = self.receive(48)
 
-        rval = ord(data[15])
+        rval = data[15]
         if rval != 0:
             # TWAMP setup request not accepted by server
             logger.critical("*** ERROR CODE %d in <<Server Start>>", rval)
+            return False
+
+        self.mode = mode
+        if mode != MODE_UNAUTHENTICATED:
+            # all further TWAMP-Control messages are encrypted and carry an HMAC
+            server_iv = data[16:32]
+            self.crypto = ControlSessionCrypto(self.aes_key, self.hmac_key, client_iv, server_iv)
+        logger.info("TWAMP-Control session in %s mode", dict((v, k) for k, v in MODE_MAP.items())[mode])
 
         self.nbrSessions = 0
+        return True
 
     def reqSession(self, sender="", s_port=20001, receiver="", r_port=20002, startTime=0, timeOut=3, dscp=0, padding=0):
-        typeP = dscp << 24
+        # Type-P Descriptor: DSCP in the 6 least significant bits [RFC4656, 3.5]
+        typeP = dscp & 0x3f
 
         if startTime != 0:
             startTime += now() + TIMEOFFSET
@@ -80,20 +121,39 @@ class ControlClient:
         logger.info("CTRL.TX <<Request Session>>")
         self.send(request)
         logger.info("CTRL.RX <<Session Accept>>")
-        data = self.receive()
+        data = self.receive(48)
 
-        rval = ord(data[0])
+        rval = data[0]
         if rval != 0:
             logger.critical("ERROR CODE %d in <<Session Accept>>", rval)
             return False
+        # the server may move the reflector to another port
+        self.port = struct.unpack('!H', data[2:4])[0] or r_port
+        self.sid = data[4:20]
+        self.nbrSessions += 1
         return True
 
+    def testSessionCrypto(self):
+        """
+        TWAMP-Test packet protection for the last accepted session, keyed
+        from the Session-keys of this control session and the SID
+        """
+        if self.mode == MODE_UNAUTHENTICATED:
+            return None
+        return TestSessionCrypto(self.mode, self.aes_key, self.hmac_key, self.sid)
+
     def startSessions(self):
         request = struct.pack('!B', 2) + generate_zero_bytes(31)
         logger.info("CTRL.TX <<Start Sessions>>")
         self.send(request)
         logger.info("CTRL.RX <<Start Accept>>")
-        self.receive()
+        data = self.receive(32)
+
+        rval = data[0]
+        if rval != 0:
+            logger.critical("ERROR CODE %d in <<Start Accept>>", rval)
+            return False
+        return True
 
     def stopSessions(self):
         request = struct.pack('!BBHLQQQ', 3, 0, 0, self.nbrSessions, 0, 0, 0)
@@ -0,0 +1,160 @@
+import functools
+import hashlib
+import hmac
+
+from twampy.constants import MODE_ENCRYPTED, HMAC_LEN, KDF_COUNT_DEFAULT, KDF_SALT_LIGHT
+
+try:
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+except ImportError:
+    Cipher = None
+
+ZERO_IV = bytes(16)
+
+
+def _cipher(key, mode):
+    if Cipher is None:
+        raise RuntimeError("authenticated/encrypted mode requires the 'cryptography' package")
+    return Cipher(algorithms.AES(key), mode)
+
+
+def derive_key(secret, salt, count=KDF_COUNT_DEFAULT, length=16):
+    """
+    Derive the shared-secret key using PBKDF2 with HMAC-SHA1 [RFC4656, 3.1]
+    """
+    if isinstance(secret, str):
+        secret = secret.encode()
+    return hashlib.pbkdf2_hmac('sha1', secret, salt, count, length)
+
+
+@functools.lru_cache(maxsize=32)
+def _light_keys(secret, count):
+    # PBKDF2 is expensive on purpose, long running processes derive once
+    return derive_key(secret, KDF_SALT_LIGHT, count, 48)
+
+
+def make_token(secret_key, challenge, aes_key, hmac_key):
+    """
+    Build the 64 byte Token of the <<Set-Up-Response>>:
+    AES-CBC (IV=0) over Challenge, AES Session-key and HMAC Session-key
+    """
+    encryptor = _cipher(secret_key, modes.CBC(ZERO_IV)).encryptor()
+    return encryptor.update(challenge + aes_key + hmac_key) + encryptor.finalize()
+
+
+class ControlSessionCrypto:
+    """
+    TWAMP-Control message protection after <<Server-Start>>.
+
+    AES-CBC contexts are kept for the whole control session, so the cipher
+    block chaining continues from one message to the next as required by
+    [RFC4656, 3.4]. Every message ends with a 16 byte HMAC over the plain
+    text of the blocks in front of it, encrypted along with the message.
+    """
+
+    def __init__(self, aes_key, hmac_key, tx_iv, rx_iv):
+        self._encrypt = _cipher(aes_key, modes.CBC(tx_iv)).encryptor().update
+        self._decrypt = _cipher(aes_key, modes.CBC(rx_iv)).decryptor().update
+        self._hmac = hmac.new(hmac_key, digestmod=hashlib.sha1)
+
+    def seal(self, data):
+        mac = self._hmac.copy()
+        mac.update(data[:-HMAC_LEN])
+        return self._encrypt(data[:-HMAC_LEN] + mac.digest()[:HMAC_LEN])
+
+    def open(self, data):
+        plain = self._decrypt(data)
+        mac = self._hmac.copy()
+        mac.update(plain[:-HMAC_LEN])
+        if not hmac.compare_digest(mac.digest()[:HMAC_LEN], plain[-HMAC_LEN:]):
+            raise ValueError("HMAC verification of TWAMP-Control message failed")
+        return plain
+
+
+class TestSessionCrypto:
+    """
+    TWAMP-Test packet protection [RFC5357, 4.1.2 and 4.2.1].
+
+    The test session keys are derived from the AES and HMAC Session-keys
+    negotiated over TWAMP-Control and the SID of the test session
+    (ControlClient.testSessionCrypto). The AES-ECB contexts and the keyed
+    HMAC state are cached, so protecting a packet only costs a context copy
+    and one or a few AES block operations on a preallocated buffer:
+        authenticated mode: first block AES-ECB, HMAC over the first N blocks
+        encrypted mode:     first N blocks AES-CBC (IV=0), HMAC over the same
+    with N=2 for sender packets and N=6 for reflector packets.
+    """
+
+    SENDER_LEN = 32      # protected bytes of a sender packet (HMAC follows)
+    REFLECTOR_LEN = 96   # protected bytes of a reflector packet (HMAC follows)
+
+    def __init__(self, mode, aes_key, hmac_key, sid=bytes(16)):
+        self.mode = mode
+
+        # test session AES key: SID encrypted with the AES Session-key (ECB)
+        test_key = _cipher(aes_key, modes.ECB()).encryptor().update(sid)
+        # test session HMAC key: HMAC Session-key encrypted (CBC, IV=SID)
+        encryptor = _cipher(test_key, modes.CBC(sid)).encryptor()
+        test_hmac_key = encryptor.update(hmac_key) + encryptor.finalize()
+
+        ecb = _cipher(test_key, modes.ECB())
+        self._encrypt = ecb.encryptor().update
+        self._decrypt = ecb.decryptor().update
+        self._hmac = hmac.new(test_hmac_key, digestmod=hashlib.sha1)
+        self._rxbuf = bytearray(self.REFLECTOR_LEN + HMAC_LEN)
+        self._rxview = memoryview(self._rxbuf)
+
+    @classmethod
+    def from_secret(cls, mode, secret, count=KDF_COUNT_DEFAULT):
+        """
+        TWAMP light (twampy extension, not part of RFC 5357): without a
+        control session both ends derive the Session-keys from the shared
+        secret and a fixed salt, the SID is zero. Only interoperates with
+        other twampy senders/reflectors.
+        """
+        keys = _light_keys(secret, count)
+        return cls(mode, keys[:16], keys[16:])
+
+    def seal(self, buf, length):
+        """
+        Protect the packet in 'buf' in place. The first 'length' bytes hold
+        the plain text, the HMAC is stored right behind them.
+        """
+        view = memoryview(buf)
+        mac = self._hmac.copy()
+        mac.update(view[:length])
+        view[length:length + HMAC_LEN] = mac.digest()[:HMAC_LEN]
+
+        if self.mode == MODE_ENCRYPTED:
+            prev = 0
+            for pos in range(0, length, 16):
+                block = int.from_bytes(view[pos:pos + 16], 'big') ^ prev
+                view[pos:pos + 16] = self._encrypt(block.to_bytes(16, 'big'))
+                prev = int.from_bytes(view[pos:pos + 16], 'big')
+        else:
+            view[0:16] = self._encrypt(view[0:16])
+
+    def open(self, data, length):
+        """
+        Verify and decrypt a received packet. Returns a view on an internal
+        buffer (valid until the next call) or None if the packet is too
+        short or the HMAC does not match.
+        """
+        if len(data) < length + HMAC_LEN:
+            return None
+
+        view = self._rxview
+        view[:length + HMAC_LEN] = data[:length + HMAC_LEN]
+
+        if self.mode == MODE_ENCRYPTED:
+            plain = int.from_bytes(self._decrypt(data[:length]), 'big')
+            chain = int.from_bytes(ZERO_IV + bytes(data[:length - 16]), 'big')
+            view[:length] = (plain ^ chain).to_bytes(length, 'big')
+        else:
+            view[0:16] = self._decrypt(data[0:16])
+
+        mac = self._hmac.copy()
+        mac.update(view[:length])
+        if not hmac.compare_digest(mac.digest()[:HMAC_LEN], bytes(view[length:length + HMAC_LEN])):
+            return None
+        return view
@@ -0,0 +1,171 @@
+import cProfile
+import os
+import pstats
+import signal
+import sys
+import threading
+import time
+import traceback
+
+from twampy.utils import now
+
+import logging
+logger = logging.getLogger("twampy")
+
+
+PROFILERS = ("cprofile", "tracemalloc")
+
+
+class reflectorDiagnostics:
+    """
+    Live diagnostics of a running SessionReflector, triggered by signals:
+        SIGUSR1  counters, session table size, host overhead histograms
+                 and the stacks of all threads
+        SIGUSR2  'seconds' long cProfile capture of the reflector hot loop
+                 or tracemalloc capture of the process
+    Reports are written to 'directory'. Nothing runs until a signal
+    arrives: the cProfile capture temporarily replaces the reflector's
+    reflect() method and puts the original back when done. Errors (e.g. an
+    unwritable directory) are logged, they never stop the reflector.
+    """
+
+    def __init__(self, reflector, directory=".", profiler="cprofile", seconds=10):
+        if profiler not in PROFILERS:
+            raise ValueError("unknown profiler '%s'" % profiler)
+        self.reflector = reflector
+        self.directory = directory
+        self.profiler = profiler
+        self.seconds = seconds
+        self.capturing = False
+        self.started = now()
+
+    def install(self):
+        signal.signal(signal.SIGUSR1, self.dump)
+        signal.signal(signal.SIGUSR2, self.capture)
+        logger.info("diagnostics: SIGUSR1 dumps counters/stacks, SIGUSR2 starts %ds %s capture (pid %d)",
+                    self.seconds, self.profiler, os.getpid())
+
+    def filename(self, kind):
+        return os.path.join(self.directory, "twampy-reflector-%d-%s.%s" % (
+            os.getpid(), time.strftime("%Y%m%d-%H%M%S"), kind))
+
+    def dump(self, signum=None, frame=None):
+        # runs as signal handler: a failing report must not stop the reflector
+        try:
+            path = self.write_report()
+        except Exception as e:
+            logger.error("diagnostics report failed: %s", str(e))
+            return
+        logger.warning("diagnostics written to %s", path)
+
+    def write_report(self):
+        reflector = self.reflector
+        path = self.filename("txt")
+        with open(path, 'w') as f:
+            f.write("uptime:            %.1fsec\n" % (now() - self.started))
+            f.write("packets reflected: %d\n" % reflector.reflected)
+            f.write("packets dropped:   %d\n" % reflector.dropped)
+            f.write("sessions:          %d\n" % len(reflector.index))
+            f.write("active sessions:   %d\n" % sum(1 for t in list(reflector.reset.values()) if t >= now()))
+            f.write("\n")
+            reflector.host.dump(f)
+
+            names = dict((thread.ident, thread.name) for thread in threading.enumerate())
+            for ident, stack in sys._current_frames().items():
+                f.write("\nThread %s (%d):\n" % (names.get(ident, "?"), ident))
+                f.write("".join(traceback.format_stack(stack)))
+        return path
+
+    def capture(self, signum=None, frame=None):
+        if self.capturing:
+            logger.warning("diagnostics capture already running")
+            return
+        self.capturing = True
+        try:
+            if self.profiler == "tracemalloc":
+                self.capture_tracemalloc()
+            else:
+                self.capture_cprofile()
+        except Exception as e:
+            logger.error("diagnostics capture failed: %s", str(e))
+            self.capturing = False
+
+    def finish(self, write, *args):
+        """ end of a capture, in the timer thread """
+        try:
+            path = write(*args)
+            logger.warning("%s capture written to %s", self.profiler, path)
+        except Exception as e:
+            logger.error("diagnostics capture failed: %s", str(e))
+        finally:
+            self.capturing = False
+
+    def start_timer(self, function, *args):
+        timer = threading.Timer(self.seconds, self.finish, (function,) + args)
+        timer.daemon = True
+        timer.name = "twl_diag"
+        timer.start()
+
+    def capture_cprofile(self):
+        """
+        cProfile only sees the thread it was enabled in, so a wrapper around
+        reflect() switches it on and off in the reflector thread for every
+        packet; the profiler is never left enabled while the reflector waits.
+        The timer ends the capture after 'seconds', with or without traffic.
+        """
+        reflector = self.reflector
+        reflect = reflector.reflect
+        profile = cProfile.Profile()
+        lock = threading.Lock()
+        state = {"packets": 0, "done": False}
+
+        def profiled(data, address, kts):
+            with lock:
+                if state["done"]:
+                    return reflect(data, address, kts)
+                state["packets"] += 1
+                profile.enable()
+                try:
+                    return reflect(data, address, kts)
+                finally:
+                    profile.disable()
+
+        def write():
+            with lock:
+                state["done"] = True
+                if reflector.__dict__.get("reflect") is profiled:
+                    del reflector.reflect
+            return self.write_cprofile(profile, state["packets"])
+
+        reflector.reflect = profiled
+        self.start_timer(write)
+        logger.warning("cProfile capture of the reflector loop started (%ds)", self.seconds)
+
+    def write_cprofile(self, profile, packets):
+        path = self.filename("prof")
+        profile.dump_stats(path)
+        with open(path + ".txt", 'w') as f:
+            f.write("%d packets reflected in %ds\n\n" % (packets, self.seconds))
+            if packets:
+                pstats.Stats(profile, stream=f).sort_stats("cumulative").print_stats(40)
+        return path
+
+    def capture_tracemalloc(self):
+        import tracemalloc
+        tracemalloc.start(16)
+        self.start_timer(self.write_tracemalloc, tracemalloc)
+        logger.warning("tracemalloc capture started (%ds)", self.seconds)
+
+    def write_tracemalloc(self, tracemalloc):
+        try:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        path = self.filename("malloc.txt")
+        with open(path, 'w') as f:
+            f.write("traced memory: current %d bytes, peak %d bytes\n\n" % (current, peak))
+            for stat in snapshot.statistics("traceback")[:25]:
+                f.write("%s\n" % stat)
+                f.write("\n".join(stat.traceback.format()) + "\n\n")
+        return path
\ No newline at end of file
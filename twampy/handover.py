@@ -0,0 +1,172 @@
+import os
+import socket
+import struct
+import threading
+
+from twampy.utils import now
+
+import logging
+logger = logging.getLogger("twampy")
+
+
+# Graceful reflector reload: the running reflector listens on a Unix socket;
+# a new reflector connects, receives the UDP socket (SCM_RIGHTS) and the
+# session table, acknowledges, and the old reflector exits.
+HANDOVER_REQUEST = b"TWAMPY-TAKEOVER\n"
+HANDOVER_ACK = b"OK"
+HANDOVER_TIMEOUT = 5
+
+# session table snapshot: version, number of sessions, then per session
+# address family, address, port, [flowinfo, scope id], next rseq, timeout
+SNAPSHOT_VERSION = 1
+HEADER = struct.Struct('!BI')
+ENTRY4 = struct.Struct('!4sHId')
+ENTRY6 = struct.Struct('!16sHIIId')
+
+
+def pack_sessions(index, reset):
+    t = now()
+    entries = []
+    for address, idx in index.items():
+        if reset[address] < t:
+            continue   # timed out, the next packet resets rseq anyway
+        host = address[0].split('%')[0]
+        if len(address) == 2:
+            entries.append(b'\x04' + ENTRY4.pack(socket.inet_pton(socket.AF_INET, host), address[1], idx, reset[address]))
+        else:
+            entries.append(b'\x06' + ENTRY6.pack(socket.inet_pton(socket.AF_INET6, host), address[1], address[2], address[3], idx, reset[address]))
+    return HEADER.pack(SNAPSHOT_VERSION, len(entries)) + b''.join(entries)
+
+
+def unpack_sessions(data):
+    version, count = HEADER.unpack_from(data, 0)
+    if version != SNAPSHOT_VERSION:
+        raise ValueError("unsupported session snapshot version %d" % version)
+
+    index = {}
+    reset = {}
+    pos = HEADER.size
+    for _ in range(count):
+        family = data[pos]
+        pos += 1
+        if family == 4:
+            addr, port, idx, timeout = ENTRY4.unpack_from(data, pos)
+            address = (socket.inet_ntop(socket.AF_INET, addr), port)
+            pos += ENTRY4.size
+        else:
+            addr, port, flowinfo, scope, idx, timeout = ENTRY6.unpack_from(data, pos)
+            address = (socket.inet_ntop(socket.AF_INET6, addr), port, flowinfo, scope)
+            pos += ENTRY6.size
+        index[address] = idx
+        reset[address] = timeout
+    return index, reset
+
+
+def _recv_exactly(conn, length):
+    data = b''
+    while len(data) < length:
+        chunk = conn.recv(length - len(data))
+        if not chunk:
+            raise OSError("handover connection closed")
+        data += chunk
+    return data
+
+
+def _bound_to(sock, addr, port):
+    """ True if 'sock' is bound to addr:port ('' is the wildcard address) """
+    host, bport = sock.getsockname()[:2]
+    wildcard = "::" if sock.family == socket.AF_INET6 else "0.0.0.0"
+    try:
+        return bport == port and socket.inet_pton(sock.family, addr or wildcard) == socket.inet_pton(sock.family, host)
+    except OSError:
+        return False
+
+
+def takeover_reflector(path, near_end=None):
+    """
+    Take over the UDP socket and the session table of the reflector
+    listening on 'path'. Returns (socket, (index, reset)). If the socket is
+    not bound to 'near_end' (addr, port), the handover is not acknowledged:
+    the running reflector carries on and OSError is raised.
+    """
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    conn.settimeout(HANDOVER_TIMEOUT)
+    try:
+        conn.connect(path)
+        conn.sendall(HANDOVER_REQUEST)
+        msg, fds, _, _ = socket.recv_fds(conn, 4, 1)
+        if not fds:
+            raise OSError("no socket received from %s" % path)
+        sock = socket.socket(fileno=fds[0])
+        sock.setblocking(True)
+
+        msg += _recv_exactly(conn, 4 - len(msg))
+        sessions = unpack_sessions(_recv_exactly(conn, struct.unpack('!I', msg)[0]))
+        if near_end and not _bound_to(sock, *near_end):
+            host, port = sock.getsockname()[:2]
+            sock.close()
+            raise OSError("reflector on %s is bound to %s:%d, not %s:%d" % ((path, host, port) + tuple(near_end)))
+        conn.sendall(HANDOVER_ACK)
+    finally:
+        conn.close()
+    return sock, sessions
+
+
+class handoverServer(threading.Thread):
+    """
+    Waits for a new reflector process and hands the socket and session
+    table of 'reflector' over. An existing socket on 'path' is only replaced
+    if no reflector listens on it any more, or if 'replace' is set because
+    its reflector has just handed over to us. While the handover is in progress the
+    reflector holds back; packets stay queued on the shared socket and are
+    reflected by the new process. If the new process does not acknowledge,
+    the reflector carries on.
+    """
+
+    def __init__(self, path, reflector, replace=False):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.name = "twl_handover"
+        self.reflector = reflector
+
+        if os.path.exists(path) and not replace:
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+                raise OSError("reflector already running on %s" % path)
+            except ConnectionRefusedError:
+                os.unlink(path)   # stale socket of a previous reflector
+            finally:
+                probe.close()
+        elif os.path.exists(path):
+            os.unlink(path)   # socket of the reflector we just took over from
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        os.chmod(path, 0o600)
+        self.server.listen(1)
+        logger.info("Wait for graceful reload on %s", path)
+
+    def run(self):
+        reflector = self.reflector
+        while reflector.running:
+            conn, _ = self.server.accept()
+            conn.settimeout(HANDOVER_TIMEOUT)
+            try:
+                if conn.recv(len(HANDOVER_REQUEST)) != HANDOVER_REQUEST:
+                    continue
+                with reflector.lock:
+                    snapshot = reflector.snapshot()
+                    try:
+                        socket.send_fds(conn, [struct.pack('!I', len(snapshot))], [reflector.socket.fileno()])
+                        conn.sendall(snapshot)
+                        ack = conn.recv(len(HANDOVER_ACK))
+                    except OSError:
+                        ack = None
+                    if ack != HANDOVER_ACK:
+                        reflector.resume()
+                        continue
+                logger.info("handed over socket and %d bytes of session state, exiting", len(snapshot))
+                reflector.running = False
+            finally:
+                conn.close()
+        self.server.close()
@@ -0,0 +1,184 @@
+import heapq
+import random
+import selectors
+import socket
+import threading
+
+from twampy.constants import DISTRIBUTIONS
+from twampy.utils import parse_addr, now
+
+import logging
+logger = logging.getLogger("twampy")
+
+
+class Impairment:
+    """
+    Impairment of one direction, similar to Linux netem:
+        delay/jitter     delay in msec drawn from 'distribution': mean and
+                         spread for uniform/normal, minimum and mean excess
+                         for the exponential/pareto tails
+        loss             probability [0..1] a packet is dropped (counted
+                         in 'dropped')
+        reorder          probability a packet skips the delay (and so
+                         overtakes the packets queued before it)
+        duplicate        probability a packet is sent twice
+        rate             link rate in bit/s (0: unlimited); packets are
+                         serialized and tail dropped once more than 'limit'
+                         packets are queued (counted in 'taildrops'); the
+                         limit does not apply to an unlimited link
+    """
+
+    def __init__(self, delay=0, jitter=0, distribution="constant", loss=0, reorder=0, duplicate=0, rate=0, limit=1000):
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError("unknown delay distribution '%s'" % distribution)
+        self.delay = float(delay) / 1000
+        self.jitter = float(jitter) / 1000
+        self.distribution = distribution
+        self.loss = loss
+        self.reorder = reorder
+        self.duplicate = duplicate
+        self.rate = rate
+        self.limit = limit
+
+        self.busy = 0      # time the rate limited link is free again
+        self.queued = 0
+        self.dropped = 0
+        self.taildrops = 0
+        self.forwarded = 0
+
+    def sample(self, rng):
+        """ delay in seconds for the next packet """
+        if self.distribution == "uniform":
+            delay = rng.uniform(self.delay - self.jitter, self.delay + self.jitter)
+        elif self.distribution == "normal":
+            delay = rng.gauss(self.delay, self.jitter)
+        elif self.distribution == "exponential" and self.jitter:
+            delay = self.delay + rng.expovariate(1 / self.jitter)
+        elif self.distribution == "pareto" and self.jitter:
+            delay = self.delay + self.jitter * 2 * (rng.paretovariate(3) - 1)   # mean 1/(alpha-1)
+        else:
+            delay = self.delay
+        return max(0, delay)
+
+    def schedule(self, rng, t, size):
+        """
+        Returns the list of release times for a packet of 'size' bytes
+        arriving at 't' (empty if dropped)
+        """
+        if self.loss and rng.random() < self.loss:
+            self.dropped += 1
+            return []
+
+        copies = 2 if self.duplicate and rng.random() < self.duplicate else 1
+        if self.rate and self.limit and self.queued + copies > self.limit:
+            self.taildrops += 1
+            return []
+
+        release = []
+        for _ in range(copies):
+            if self.reorder and rng.random() < self.reorder:
+                delay = 0
+            else:
+                delay = self.sample(rng)
+            if self.rate:
+                self.busy = max(self.busy, t) + size * 8.0 / self.rate
+                release.append(self.busy + delay)
+            else:
+                release.append(t + delay)
+        self.queued += copies
+        return release
+
+
+class ImpairmentProxy(threading.Thread):
+    """
+    UDP proxy between session senders and a session reflector.
+
+    Every sender address gets its own upstream socket, so the reflector
+    still sees one UDP session per sender. Packets are kept in a heap ordered
+    by release time and all sockets are served from a single selector loop.
+    All random decisions come from one seeded generator, so a run with the
+    same seed and arrival order is reproducible.
+    """
+
+    def __init__(self, near_end, far_end, outbound=None, inbound=None, seed=None):
+        threading.Thread.__init__(self)
+        addr, port, ipversion = parse_addr(near_end, 20002)
+        rip, rpt, ripv = parse_addr(far_end, 20001)
+
+        self.family = socket.AF_INET6 if 6 in (ipversion, ripv) else socket.AF_INET
+        self.remote = (rip or ("::1" if self.family == socket.AF_INET6 else "127.0.0.1"), rpt)
+        self.outbound = outbound or Impairment()
+        self.inbound = inbound or Impairment()
+        self.rng = random.Random(seed)
+
+        self.socket = socket.socket(self.family, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((addr, port))
+        self.socket.setblocking(False)
+
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.socket, selectors.EVENT_READ, None)
+        self.upstream = {}     # sender address -> upstream socket
+        self.queue = []        # (release time, seq, impairment, socket, data, address)
+        self.seq = 0
+        self.running = True
+        logger.info("Impairment proxy [%s]:%d -> [%s]:%d", addr, port, self.remote[0], self.remote[1])
+
+    def connect(self, address):
+        upstream = socket.socket(self.family, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        upstream.setblocking(False)
+        upstream.connect(self.remote)
+        self.selector.register(upstream, selectors.EVENT_READ, address)
+        self.upstream[address] = upstream
+        logger.info("new session from %s:%d", address[0], address[1])
+        return upstream
+
+    def enqueue(self, impairment, t, sock, data, address):
+        for release in impairment.schedule(self.rng, t, len(data)):
+            self.seq += 1
+            heapq.heappush(self.queue, (release, self.seq, impairment, sock, data, address))
+
+    def run(self):
+        queue = self.queue
+        select = self.selector.select
+
+        while self.running:
+            timeout = max(0, queue[0][0] - now()) if queue else 0.1
+            for key, _ in select(timeout):
+                sock = key.fileobj
+                for _ in range(64):
+                    try:
+                        data, address = sock.recvfrom(9216)
+                    except (BlockingIOError, InterruptedError):
+                        break
+                    except OSError:
+                        break   # e.g. ICMP port unreachable from the reflector
+                    t = now()
+                    if key.data is None:
+                        upstream = self.upstream.get(address) or self.connect(address)
+                        self.enqueue(self.outbound, t, upstream, data, None)
+                    else:
+                        self.enqueue(self.inbound, t, self.socket, data, key.data)
+
+            t = now()
+            while queue and queue[0][0] <= t:
+                _, _, impairment, sock, data, address = heapq.heappop(queue)
+                impairment.queued -= 1
+                impairment.forwarded += 1
+                try:
+                    if address is None:
+                        sock.send(data)
+                    else:
+                        sock.sendto(data, address)
+                except OSError as e:
+                    logger.debug("forwarding failed: %s", str(e))
+
+        for key in list(self.selector.get_map().values()):
+            key.fileobj.close()
+        self.selector.close()
+        logger.info("Impairment proxy stopped [outbound: %d forwarded, %d dropped, %d tail drops; inbound: %d forwarded, %d dropped, %d tail drops]",
+                    self.outbound.forwarded, self.outbound.dropped, self.outbound.taildrops,
+                    self.inbound.forwarded, self.inbound.dropped, self.inbound.taildrops)
+
+    def stop(self, signum=None, frame=None):
+        self.running = False
@@ -0,0 +1,149 @@
+import mmap
+import os
+import struct
+
+import logging
+logger = logging.getLogger("twampy")
+
+
+# pcap [https://wiki.wireshark.org/Development/LibpcapFileFormat]
+PCAP_MAGIC_US = 0xa1b2c3d4
+PCAP_MAGIC_NS = 0xa1b23c4d
+
+# pcapng [draft-ietf-opsawg-pcapng]
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_IDB = 0x00000001
+PCAPNG_PB = 0x00000002      # obsolete Packet Block
+PCAPNG_EPB = 0x00000006
+PCAPNG_BOM = 0x1A2B3C4D
+PCAPNG_IF_TSRESOL = 9
+
+
+def _map(path):
+    """ read-only map of the file, None for an empty file (mmap refuses those) """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if hasattr(mm, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+        mm.madvise(mmap.MADV_SEQUENTIAL)
+    return mm
+
+
+class captureFile:
+    """
+    Stream the packets of a pcap or pcapng file through mmap. Iterating
+    yields (timestamp, linktype, buffer, offset, caplen) tuples; 'buffer' is
+    the mapped file itself, so no packet data is copied. Malformed records
+    are skipped and counted in 'malformed'.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.malformed = 0
+
+    def __iter__(self):
+        mm = _map(self.path)
+        if mm is None:
+            logger.warning("%s: empty capture file skipped", self.path)
+            return
+        try:
+            if len(mm) < 4:
+                return
+            magic = struct.unpack_from('<I', mm, 0)[0]
+            if magic == PCAPNG_SHB:
+                yield from self._read_pcapng(mm)
+            elif magic in (PCAP_MAGIC_US, PCAP_MAGIC_NS):
+                yield from self._read_pcap(mm, '<')
+            elif struct.unpack_from('>I', mm, 0)[0] in (PCAP_MAGIC_US, PCAP_MAGIC_NS):
+                yield from self._read_pcap(mm, '>')
+            else:
+                logger.error("%s: unknown capture file format", self.path)
+        finally:
+            mm.close()
+
+    def skip(self, pos, reason):
+        self.malformed += 1
+        logger.debug("%s: malformed record at offset %d skipped (%s)", self.path, pos, reason)
+
+    def _read_pcap(self, mm, endian):
+        size = len(mm)
+        if size < 24:
+            logger.warning("%s: truncated capture file header", self.path)
+            return
+        magic, _, _, _, _, _, linktype = struct.unpack_from(endian + 'IHHiIII', mm, 0)
+        scale = 1e-9 if magic == PCAP_MAGIC_NS else 1e-6
+        record = struct.Struct(endian + 'IIII')
+
+        pos = 24
+        while pos + 16 <= size:
+            sec, frac, caplen, _ = record.unpack_from(mm, pos)
+            pos += 16
+            if pos + caplen > size:
+                logger.warning("%s: truncated capture file, stopped at offset %d", self.path, pos)
+                break
+            yield sec + frac * scale, linktype, mm, pos, caplen
+            pos += caplen
+
+    def _read_pcapng(self, mm):
+        size = len(mm)
+        endian = '<'
+        interfaces = []
+
+        pos = 0
+        while pos + 12 <= size:
+            btype = struct.unpack_from(endian + 'I', mm, pos)[0]
+            if btype == PCAPNG_SHB:
+                # every section may switch the byte order
+                endian = '<' if struct.unpack_from('<I', mm, pos + 8)[0] == PCAPNG_BOM else '>'
+                interfaces = []
+            blen = struct.unpack_from(endian + 'I', mm, pos + 4)[0]
+            if blen < 12 or pos + blen > size:
+                logger.warning("%s: truncated capture file, stopped at offset %d", self.path, pos)
+                break
+            end = pos + blen - 4   # trailing block length
+
+            if btype in (PCAPNG_EPB, PCAPNG_PB):
+                packet = self._packet_block(mm, endian, btype, pos, end, interfaces)
+                if packet:
+                    yield packet
+            elif btype == PCAPNG_IDB:
+                if pos + 16 > end:
+                    self.skip(pos, "short interface description block")
+                    interfaces.append((None, 1e-6))   # keep the interface numbering
+                else:
+                    linktype = struct.unpack_from(endian + 'H', mm, pos + 8)[0]
+                    interfaces.append((linktype, _tsresol(mm, endian, pos + 16, end)))
+
+            pos += blen
+
+    def _packet_block(self, mm, endian, btype, pos, end, interfaces):
+        if pos + 28 > end:
+            return self.skip(pos, "short packet block")
+        if btype == PCAPNG_EPB:
+            ifid, tshi, tslo, caplen = struct.unpack_from(endian + 'IIII', mm, pos + 8)
+        else:
+            ifid, _, tshi, tslo, caplen = struct.unpack_from(endian + 'HHIII', mm, pos + 8)
+        if ifid >= len(interfaces) or interfaces[ifid][0] is None:
+            return self.skip(pos, "undefined interface %d" % ifid)
+        if pos + 28 + caplen > end:
+            return self.skip(pos, "captured length beyond block")
+        linktype, scale = interfaces[ifid]
+        return ((tshi << 32) | tslo) * scale, linktype, mm, pos + 28, caplen
+
+
+def _tsresol(mm, endian, pos, end):
+    """ if_tsresol option of an Interface Description Block (default: usec) """
+    while pos + 4 <= end:
+        code, length = struct.unpack_from(endian + 'HH', mm, pos)
+        if code == 0:
+            break
+        if code == PCAPNG_IF_TSRESOL:
+            if pos + 5 > end:
+                break
+            value = mm[pos + 4]
+            if value & 0x80:
+                return 2.0 ** -(value & 0x7f)
+            return 10.0 ** -value
+        pos += 4 + ((length + 3) & ~3)
+    return 1e-6
@@ -0,0 +1,262 @@
+import csv
+import json
+import os
+import queue
+import threading
+import time
+
+import logging
+logger = logging.getLogger("twampy")
+
+
+# one schema for all sinks: "packet" records per reply, "summary" records per run
+FIELDS = ["type", "time", "sender", "reflector", "tos", "sseq", "rseq", "rtt", "outbound", "inbound",
+          "sent", "received"] + \
+         ["%s_%s" % (direction, value) for direction in ("outbound", "inbound", "roundtrip")
+          for value in ("min", "max", "avg", "jitter", "loss")] + \
+         ["send_lateness_p99", "receive_wait_p99", "loop_p99", "unreliable"]
+
+POLICIES = ("block", "drop-newest", "drop-oldest")
+
+_CLOSE = object()
+
+
+class resultSink(threading.Thread):
+    """
+    Base class of the result sinks.
+
+    Records are handed over through a bounded queue and written in batches
+    by the sink's own thread, so put() never waits for I/O. When the queue
+    is full the policy decides: 'drop-newest' (default) discards the new
+    record, 'drop-oldest' the oldest queued one; neither ever delays the
+    producer. 'block' applies backpressure: the producer waits up to
+    'timeout' seconds for room before the record is dropped. Every wait
+    delays the measurement thread calling put() and so its send schedule and
+    receive timestamps; waits are counted in 'blocked', records dropped
+    after a wait in 'timeouts' (included in 'dropped'). Subclasses implement
+    write(), returning the number of records that reached the file, and
+    close_file().
+    """
+
+    def __init__(self, path, queue_size=10000, batch_size=500, policy="drop-newest", timeout=0.005):
+        threading.Thread.__init__(self)
+        if policy not in POLICIES:
+            raise ValueError("unknown drop policy '%s'" % policy)
+        self.daemon = True
+        self.name = "twl_sink_%s" % os.path.basename(path)
+        self.path = path
+        self.queue = queue.Queue(queue_size)
+        self.batch_size = batch_size
+        self.policy = policy
+        self.timeout = timeout
+
+        self.lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.blocked = 0
+        self.timeouts = 0
+        self.batches = 0
+        self.start()
+
+    def put(self, record):
+        try:
+            self.queue.put_nowait(record)
+            return True
+        except queue.Full:
+            pass
+
+        if self.policy == "block":
+            with self.lock:
+                self.blocked += 1
+            try:
+                self.queue.put(record, timeout=self.timeout)
+                return True
+            except queue.Full:
+                with self.lock:
+                    self.timeouts += 1
+        elif self.policy == "drop-oldest":
+            try:
+                self.queue.get_nowait()
+                self.queue.put_nowait(record)
+            except (queue.Empty, queue.Full):
+                pass
+        with self.lock:
+            self.dropped += 1
+        return False
+
+    def counters(self):
+        with self.lock:
+            return {"written": self.written, "dropped": self.dropped,
+                    "blocked": self.blocked, "timeouts": self.timeouts,
+                    "batches": self.batches, "queued": self.queue.qsize()}
+
+    def run(self):
+        closing = False
+        while not closing:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if _CLOSE in batch:
+                closing = True
+                del batch[batch.index(_CLOSE):]
+            if batch:
+                try:
+                    written = self.write(batch)
+                    with self.lock:
+                        self.written += written
+                        self.batches += 1
+                except Exception as e:
+                    logger.error("%s: write failed, %d records lost: %s", self.path, len(batch), str(e))
+                    with self.lock:
+                        self.dropped += len(batch)
+        self.close_file()
+
+    def close(self, timeout=5.0):
+        """
+        Write all queued records and close the sink. Waits at most 'timeout'
+        seconds for a stalled writer: records still queued then are
+        abandoned and counted as dropped.
+        """
+        deadline = time.monotonic() + timeout
+        try:
+            self.queue.put(_CLOSE, timeout=timeout)
+            self.join(max(0, deadline - time.monotonic()))
+        except queue.Full:
+            pass
+        if self.is_alive():
+            abandoned = 0
+            try:
+                while True:
+                    if self.queue.get_nowait() is not _CLOSE:
+                        abandoned += 1
+            except queue.Empty:
+                pass
+            # let the writer finish and close the file if it ever recovers
+            self.queue.put_nowait(_CLOSE)
+            with self.lock:
+                self.dropped += abandoned
+            logger.error("%s: writer stalled, sink not closed after %.1fsec, %d queued records dropped",
+                         self.path, timeout, abandoned)
+        counters = self.counters()
+        logger.info("%s: %d records written, %d dropped", self.path, counters["written"], counters["dropped"])
+        if counters["blocked"]:
+            logger.warning("%s: measurement delayed %d times waiting for the sink (%d records dropped after %.1fms)",
+                           self.path, counters["blocked"], counters["timeouts"], 1000 * self.timeout)
+        return counters
+
+    def write(self, batch):
+        raise NotImplementedError
+
+    def close_file(self):
+        pass
+
+
+class jsonLinesSink(resultSink):
+
+    def __init__(self, path, **kwargs):
+        self.file = open(path, 'a')
+        resultSink.__init__(self, path, **kwargs)
+
+    def write(self, batch):
+        self.file.write("".join(json.dumps(record) + "\n" for record in batch))
+        self.file.flush()
+        return len(batch)
+
+    def close_file(self):
+        self.file.close()
+
+
+class csvSink(resultSink):
+
+    def __init__(self, path, **kwargs):
+        header = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, 'a', newline='')
+        self.writer = csv.DictWriter(self.file, FIELDS, extrasaction='ignore')
+        if header:
+            self.writer.writeheader()
+        resultSink.__init__(self, path, **kwargs)
+
+    def write(self, batch):
+        self.writer.writerows(batch)
+        self.file.flush()
+        return len(batch)
+
+    def close_file(self):
+        self.file.close()
+
+
+class parquetSink(resultSink):
+    """
+    Columnar output (Apache Parquet, requires pyarrow). Batches are
+    collected into row groups of 'row_group_size' records.
+    """
+
+    STRINGS = ("type", "sender", "reflector")
+    INTEGERS = ("tos", "sseq", "rseq", "sent", "received")
+    BOOLEANS = ("unreliable",)
+
+    def __init__(self, path, row_group_size=65536, **kwargs):
+        # imported here, pyarrow takes longer to load than a short test run
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("parquet output requires the 'pyarrow' package")
+        self.pyarrow = pyarrow
+        self.schema = pyarrow.schema([
+            (name, pyarrow.string() if name in self.STRINGS else
+             pyarrow.int64() if name in self.INTEGERS else
+             pyarrow.bool_() if name in self.BOOLEANS else pyarrow.float64())
+            for name in FIELDS])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+        self.row_group_size = row_group_size
+        self.pending = []
+        resultSink.__init__(self, path, **kwargs)
+
+    def write(self, batch):
+        # buffered records only count as written once their row group is
+        self.pending.extend(batch)
+        if len(self.pending) >= self.row_group_size:
+            return self.flush()
+        return 0
+
+    def flush(self):
+        """ write the buffered records as a row group, returns their number """
+        rows, self.pending = self.pending, []
+        if not rows:
+            return 0
+        try:
+            self.writer.write_table(self.pyarrow.Table.from_pylist(rows, self.schema))
+        except Exception as e:
+            logger.error("%s: write failed, %d records lost: %s", self.path, len(rows), str(e))
+            with self.lock:
+                self.dropped += len(rows)
+            return 0
+        return len(rows)
+
+    def close_file(self):
+        written = self.flush()
+        with self.lock:
+            self.written += written
+        self.writer.close()
+
+
+SINKS = {"jsonl": jsonLinesSink, "csv": csvSink, "parquet": parquetSink}
+
+
+def open_sink(spec, **kwargs):
+    """
+    Open a sink from 'format:path' or from a path with a known extension
+    (.jsonl, .csv, .parquet)
+    """
+    fmt, _, path = spec.partition(':')
+    if fmt not in SINKS or not path:
+        path = spec
+        fmt = os.path.splitext(spec)[1].lstrip('.').lower()
+        fmt = "jsonl" if fmt in ("json", "ndjson") else fmt
+    if fmt not in SINKS:
+        raise ValueError("unknown result format for '%s' (use %s)" % (spec, ", ".join(SINKS)))
+    return SINKS[fmt](path, **kwargs)
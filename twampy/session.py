@@ -1,21 +1,37 @@
 import binascii
 import socket
+import struct
 import sys
 import threading
 
 import logging
 logger = logging.getLogger("twampy")
 
+# kernel receive timestamps [linux: include/uapi/asm-generic/socket.h]
+SO_TIMESTAMPNS = 35
+SCM_TIMESTAMPNS = SO_TIMESTAMPNS
+
 class udpSession(threading.Thread):
 
-    def __init__(self, addr="", port=20000, tos=0, ttl=64, do_not_fragment=False, ipversion=4):
+    def __init__(self, addr="", port=20000, tos=0, ttl=64, do_not_fragment=False, ipversion=4, sock=None):
         threading.Thread.__init__(self)
-        if ipversion == 6:
+        if sock is not None:
+            # already bound socket, e.g. kept warm by the agent
+            self.socket = sock
+        elif ipversion == 6:
             self.bind6(addr, port, tos, ttl)
         else:
             self.bind(addr, port, tos, ttl, do_not_fragment)
         self.running = True
 
+        self.timestamps = False
+        if sys.platform.startswith("linux"):
+            try:
+                self.socket.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+                self.timestamps = True
+            except OSError:
+                logger.debug("kernel receive timestamps not available")
+
     def bind(self, addr, port, tos, ttl, df):
         logger.debug(
             "bind(addr=%s, port=%d, tos=%d, ttl=%d)", addr, port, tos, ttl)
@@ -59,9 +75,31 @@ class udpSession(threading.Thread):
         logger.debug("received: %s", binascii.hexlify(data))
         return data, address
 
+    def recvfrom_ts(self, flags=0):
+        """
+        Like recvfrom(), also returns the kernel receive timestamp (None if
+        the platform does not provide one)
+        """
+        if not self.timestamps:
+            data, address = self.socket.recvfrom(9216, flags)
+            logger.debug("received: %s", binascii.hexlify(data))
+            return data, address, None
+
+        data, ancdata, _, address = self.socket.recvmsg(9216, socket.CMSG_SPACE(16), flags)
+        logger.debug("received: %s", binascii.hexlify(data))
+        for level, ctype, cdata in ancdata:
+            if level == socket.SOL_SOCKET and ctype == SCM_TIMESTAMPNS:
+                sec, nsec = struct.unpack('qq', cdata[:16])
+                return data, address, sec + nsec * 1e-9
+        return data, address, None
+
     def stop(self, signum, frame):
         logger.info("SIGINT received: Stop TWL session")
         # if self.running and self.socket.
         self.running = False
-        self.socket.shutdown(socket.SHUT_RDWR)
+        try:
+            # wakes up a blocking recvfrom(), unconnected UDP sockets report ENOTCONN
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
         self.socket.close()
\ No newline at end of file
@@ -1,10 +1,15 @@
+import select
+import socket
 import struct
 import random
+import threading
 
 
+from twampy.handover import handoverServer, pack_sessions, takeover_reflector
 from twampy.session import udpSession
+from twampy.statistics import hostStatistics
 from twampy.utils import parse_addr, now, time_ntp2py, generate_zero_bytes
-from twampy.constants import TIMEOFFSET, ALLBITS
+from twampy.constants import TIMEOFFSET, ALLBITS, HMAC_LEN
 
 
 import logging
@@ -13,7 +18,7 @@ logger = logging.getLogger("twampy")
 
 class SessionReflector(udpSession):
 
-    def __init__(self, near_end):
+    def __init__(self, near_end, crypto=None, overhead_threshold=1.0, handover=None, takeover=None):
         addr, port, ipversion = parse_addr(near_end, 20001)
 
         # if padding != -1:
@@ -23,52 +28,156 @@ class SessionReflector(udpSession):
         # else:
         #     self.padmix = [8, 8, 8, 8, 8, 8, 8, 534, 534, 534, 534, 1458]
 
-        udpSession.__init__(self, addr, port, ipversion)
+        sock = None
+        if takeover:
+            # graceful reload: continue on the socket and sessions of the running reflector
+            sock, sessions = takeover_reflector(takeover, (addr, port))
+        udpSession.__init__(self, addr, port, ipversion=ipversion, sock=sock)
+
+        # authenticated/encrypted mode: TestSessionCrypto with cached keys
+        self.crypto = crypto
+        if crypto:
+            self.rbuf = bytearray(9216)
+
+        self.host = hostStatistics(overhead_threshold)
+        self.reflected = 0
+        self.dropped = 0
+
+        # session table: remote address -> next rseq / session timeout
+        self.index = {}
+        self.reset = {}
+        self.pbytes = {}
+        if sock is not None:
+            self.index, self.reset = sessions
+            logger.info("took over %d sessions from the previous reflector", len(self.index))
+
+        # graceful reload: while 'lock' is held no packet is being reflected
+        self.lock = threading.Lock()
+        self.handed_over = False
+        self.handover = None
+        if handover:
+            self.handover = handoverServer(handover, self, replace=sock is not None)
+
+    def snapshot(self):
+        """
+        Stop reflecting and return the serialized session table. Must be
+        called with 'lock' held.
+        """
+        self.handed_over = True
+        return pack_sessions(self.index, self.reset)
+
+    def stop(self, signum, frame):
+        if self.handed_over:
+            # the socket is shared with the new reflector: shutdown() would
+            # stop it there too, only close our descriptor
+            logger.info("SIGINT received: Stop TWL session")
+            self.running = False
+            self.socket.close()
+            return
+        udpSession.stop(self, signum, frame)
+
+    def resume(self):
+        logger.warning("handover failed, continue reflecting")
+        self.handed_over = False
 
     def run(self):
-        index = {}
-        reset = {}
-        pbytes = {}
-
+        if self.handover:
+            self.handover.start()
+            self.run_handover()
+        else:
+            while self.running:
+                try:
+                    data, address, kts = self.recvfrom_ts()
+                    self.reflect(data, address, kts)
+                except Exception:
+                    if not self.running:
+                        # socket closed by stop()
+                        break
+                    raise
+
+        logger.info("TWL session reflector stopped")
+        if self.host.unreliable():
+            logger.warning("host overhead above %.3fms (P99), reflected timestamps include host error", self.host.threshold)
+        self.host.dump()
+
+    def run_handover(self):
+        """
+        Reflector loop when the socket may be handed over to a new process:
+        packets are only read with 'lock' held, so after the handover all
+        packets still queued on the shared socket go to the new process.
+        """
         while self.running:
             try:
-                data, address = self.recvfrom()
-                data_len = len(data)
-
-                t2 = now()
-                sec = int(TIMEOFFSET + t2)             # seconds since 1-JAN-1900
-                msec = int((t2 - int(t2)) * ALLBITS)  # 32bit fraction of the second
-
-                sseq = struct.unpack('!I', data[0:4])[0]
-                t1 = time_ntp2py(data[4:12])
-
-                logger.info("Request from %s:%d [sseq=%d outbound=%.2fms len=%dbytes]", address[0], address[1], sseq, 1000 * (t2 - t1), data_len)
-
-                idx = 0
-                if address not in index.keys():
-                    logger.info("set rseq:=0     (new remote address/port)")
-                    pbytes[address]=b''
-                elif reset[address] < t2:
-                    logger.info("reset rseq:=0   (session timeout, 30sec)")
-                elif sseq == 0:
-                    logger.info("reset rseq:=0   (received sseq==0)")
-                    pbytes[address]=b''
-                else:
-                    idx = index[address]
-
-                rdata = struct.pack('!L2I2H2I', idx, sec, msec, 0x001, 0, sec, msec)
-                if not pbytes[address] and data_len > len(rdata):
-                    padding = int(data_len-len(rdata)-14)
-                    logger.debug('padding: %d zero bytes' % padding )
-                    pbytes[address] = generate_zero_bytes(padding)
-                self.sendto(rdata + data[0:14] + pbytes[address], address)
-
-                index[address] = idx + 1
-                reset[address] = t2 + 30  # timeout is 30sec
-
-            except Exception as e:
+                if not select.select([self.socket], [], [], 0.1)[0]:
+                    continue
+                with self.lock:
+                    if self.handed_over:
+                        continue
+                    try:
+                        data, address, kts = self.recvfrom_ts(socket.MSG_DONTWAIT)
+                    except BlockingIOError:
+                        continue
+                    self.reflect(data, address, kts)
+            except Exception:
+                if not self.running:
+                    break
                 raise
-                logger.debug('Exception: %s', str(e))
-                break
 
-        logger.info("TWL session reflector stopped")
\ No newline at end of file
+    def reflect(self, data, address, kts):
+        index = self.index
+        reset = self.reset
+        pbytes = self.pbytes
+
+        data_len = len(data)
+
+        t2 = now()
+        if kts:
+            self.host.rxwait.add(1000 * (t2 - kts))
+        sec = int(TIMEOFFSET + t2)             # seconds since 1-JAN-1900
+        msec = int((t2 - int(t2)) * ALLBITS)  # 32bit fraction of the second
+
+        if self.crypto:
+            plain = self.crypto.open(data, self.crypto.SENDER_LEN)
+            if plain is None:
+                logger.error("HMAC verification failed, packet from %s:%d dropped", address[0], address[1])
+                self.dropped += 1
+                return
+            sseq = struct.unpack_from('!I', plain, 0)[0]
+            t1 = time_ntp2py(plain[16:24])
+        else:
+            sseq = struct.unpack('!I', data[0:4])[0]
+            t1 = time_ntp2py(data[4:12])
+
+        logger.info("Request from %s:%d [sseq=%d outbound=%.2fms len=%dbytes]", address[0], address[1], sseq, 1000 * (t2 - t1), data_len)
+
+        idx = 0
+        if address not in index.keys():
+            logger.info("set rseq:=0     (new remote address/port)")
+            pbytes[address]=b''
+        elif reset[address] < t2:
+            logger.info("reset rseq:=0   (session timeout, 30sec)")
+        elif sseq == 0:
+            logger.info("reset rseq:=0   (received sseq==0)")
+            pbytes[address]=b''
+        else:
+            idx = index[address]
+
+        if self.crypto:
+            # reflector packet [RFC5357, 4.2.1], padded to the size of the request
+            struct.pack_into('!L12x2IH6x2I8xL12x8s2s6xB15x', self.rbuf, 0, idx, sec, msec, 0x001, sec, msec, sseq, bytes(plain[16:24]), bytes(plain[24:26]), 0)
+            self.crypto.seal(self.rbuf, self.crypto.REFLECTOR_LEN)
+            length = max(self.crypto.REFLECTOR_LEN + HMAC_LEN, data_len)
+            self.sendto(memoryview(self.rbuf)[:length], address)
+        else:
+            rdata = struct.pack('!L2I2H2I', idx, sec, msec, 0x001, 0, sec, msec)
+            if not pbytes.get(address) and data_len > len(rdata):
+                padding = int(data_len-len(rdata)-14)
+                logger.debug('padding: %d zero bytes' % padding )
+                pbytes[address] = generate_zero_bytes(padding)
+            self.sendto(rdata + data[0:14] + pbytes.get(address, b''), address)
+
+        index[address] = idx + 1
+        reset[address] = t2 + 30  # timeout is 30sec
+
+        self.reflected += 1
+        self.host.loop.add(1000 * (now() - t2))
@@ -1,12 +1,13 @@
 import select
 import struct
 import random
+import threading
 
 
 from twampy.session import udpSession
-from twampy.statistics import twampStatistics
+from twampy.statistics import twampStatistics, hostStatistics, dump_classes
 from twampy.utils import parse_addr, now, time_ntp2py, generate_zero_bytes
-from twampy.constants import TIMEOFFSET, ALLBITS
+from twampy.constants import TIMEOFFSET, ALLBITS, HMAC_LEN
 
 
 import logging
@@ -15,20 +16,25 @@ logger = logging.getLogger("twampy")
 
 class SessionSender(udpSession):
 
-    def __init__(self, near_end, far_end, count, interval, tos, ttl, padding, do_not_fragment):
+    def __init__(self, near_end, far_end, count, interval, tos, ttl, padding, do_not_fragment, crypto=None, sock=None, output=None, sinks=(), overhead_threshold=1.0):
         # Session Sender / Session Reflector:
         #   get Address, UDP port, IP version from near_end/far_end attributes
         sip, spt, sipv = parse_addr(near_end, 20000)
         rip, rpt, ripv = parse_addr(far_end,  20001)
 
         ipversion = 6 if (sipv == 6) or (ripv == 6) else 4
-        udpSession.__init__(self, sip, spt, tos, ttl, do_not_fragment, ipversion)
+        udpSession.__init__(self, sip, spt, tos, ttl, do_not_fragment, ipversion, sock)
 
         self.remote_addr = rip
         self.remote_port = rpt
         self.interval = float(interval) / 1000
         self.count = count
         self.stats = twampStatistics()
+        self.host = hostStatistics(overhead_threshold)
+        self.output = output
+        self.sinks = sinks
+        self.tos = tos
+        self.local = "%s:%d" % self.socket.getsockname()[:2]
 
         if padding != -1:
             self.padmix = [padding]
@@ -37,55 +43,199 @@ class SessionSender(udpSession):
         else:
             self.padmix = [8, 8, 8, 8, 8, 8, 8, 534, 534, 534, 534, 1458]
 
+        # authenticated/encrypted mode: TestSessionCrypto with cached keys
+        self.crypto = crypto
+        if crypto:
+            # offsets of rseq, t3, t2, sseq, t1 in a reflector packet [RFC5357, 4.2.1]
+            self.offsets = (0, 16, 32, 48, 64)
+            self.minlen = crypto.REFLECTOR_LEN + HMAC_LEN
+            self.txbuf = bytearray(crypto.SENDER_LEN + HMAC_LEN + max(self.padmix))
+        else:
+            self.offsets = (0, 4, 16, 24, 28)
+            self.minlen = 36
+
     def run(self):
         schedule = now()
         endtime = schedule + self.count * self.interval + 5
 
         idx = 0
+        wakeup = now()
         while self.running:
             while select.select([self.socket], [], [], 0)[0]:
-                t4 = now()
-                data, address = self.recvfrom()
+                if self.receive(wakeup):
+                    logger.info("All packets received back")
+                    self.running = False
+
+            t1 = now()
+            if (t1 >= schedule) and (idx < self.count):
+                self.host.lateness.add(1000 * (t1 - schedule))
+                schedule = schedule + self.interval
+                self.transmit(idx, t1)
+                idx = idx + 1
 
-                if len(data) < 36:
-                    logger.error("short packet received: %d bytes", len(data))
-                    continue
+            if (t1 > endtime):
+                logger.info("Receive timeout for last packet (don't wait anymore)")
+                self.running = False
+
+            # sleep until the next packet is due or a reply arrives
+            t = now()
+            self.host.loop.add(1000 * (t - wakeup))
+            timeout = schedule - t if idx < self.count else min(0.1, endtime - t)
+            if self.running and timeout > 0:
+                select.select([self.socket], [], [], timeout)
+            wakeup = now()
+
+        self.stats.dump(idx, self.output)
+        self.host.dump(self.output)
+        self.report(idx)
+
+    def transmit(self, idx, t1):
+        padding = self.padmix[int(len(self.padmix) * random.random())]
+        if self.crypto:
+            struct.pack_into('!L12x2IH6x', self.txbuf, 0, idx, int(TIMEOFFSET + t1), int((t1 - int(t1)) * ALLBITS), 0x3fff)
+            self.crypto.seal(self.txbuf, self.crypto.SENDER_LEN)
+            length = self.crypto.SENDER_LEN + HMAC_LEN + padding
+            self.sendto(memoryview(self.txbuf)[:length], (self.remote_addr, self.remote_port))
+        else:
+            data = struct.pack('!L2IH', idx, int(TIMEOFFSET + t1), int((t1 - int(t1)) * ALLBITS), 0x3fff)
+            pbytes = generate_zero_bytes(padding)
+            self.sendto(data + pbytes, (self.remote_addr, self.remote_port))
+        logger.info("Sent to %s [sseq=%d]", self.remote_addr, idx)
+
+    def receive(self, wakeup):
+        """
+        Read and account one reply. Returns True once the reply to the last
+        packet of the session arrived.
+        """
+        t4 = now()
+        data, address, kts = self.recvfrom_ts()
+        # time the reply waited (in the kernel or since wakeup) before t4
+        self.host.rxwait.add(1000 * (t4 - (kts or wakeup)))
+
+        if len(data) < self.minlen:
+            logger.error("short packet received: %d bytes", len(data))
+            return False
+
+        if self.crypto:
+            data = self.crypto.open(data, self.crypto.REFLECTOR_LEN)
+            if data is None:
+                logger.error("HMAC verification failed, packet from %s dropped", address[0])
+                return False
+
+        o_rseq, o_t3, o_t2, o_sseq, o_t1 = self.offsets
+        t3 = time_ntp2py(data[o_t3:o_t3 + 8])
+        t2 = time_ntp2py(data[o_t2:o_t2 + 8])
+        t1 = time_ntp2py(data[o_t1:o_t1 + 8])
+
+        delayRT = max(0, 1000 * (t4 - t1 + t2 - t3))  # round-trip delay
+        delayOB = max(0, 1000 * (t2 - t1))            # out-bound delay
+        delayIB = max(0, 1000 * (t4 - t3))            # in-bound delay
+
+        rseq = struct.unpack_from('!I', data, o_rseq)[0]
+        sseq = struct.unpack_from('!I', data, o_sseq)[0]
+
+        logger.info("Reply from %s [rseq=%d sseq=%d rtt=%.2fms outbound=%.2fms inbound=%.2fms]", address[0], rseq, sseq, delayRT, delayOB, delayIB)
+        self.stats.add(delayRT, delayOB, delayIB, rseq, sseq)
+
+        for sink in self.sinks:
+            sink.put({"type": "packet", "time": t1, "sender": self.local, "reflector": "%s:%d" % address[:2], "tos": self.tos,
+                      "sseq": sseq, "rseq": rseq, "rtt": delayRT, "outbound": delayOB, "inbound": delayIB})
+
+        return sseq + 1 == self.count
+
+    def report(self, total):
+        """ summary record of the session to the result sinks """
+        if self.sinks:
+            record = {"type": "summary", "time": now(), "sender": self.local, "reflector": "%s:%d" % (self.remote_addr, self.remote_port), "tos": self.tos}
+            record.update(self.stats.summary(total))
+            record.update(self.host.summary())
+            for sink in self.sinks:
+                sink.put(record)
+
+
+class MultiSessionSender(threading.Thread):
+    """
+    Probes several traffic classes over the same path in one run: one
+    SessionSender (and socket) per class, local ports counting up from the
+    near-end port (or ephemeral ports for port 0), all driven by a single
+    loop with a shared schedule, so the run takes as long as a single-class
+    run.
+    """
+
+    def __init__(self, near_end, far_end, count, interval, classes, ttl, padding, do_not_fragment, crypto=None, output=None, sinks=(), overhead_threshold=1.0):
+        threading.Thread.__init__(self)
+        sip, spt, sipv = parse_addr(near_end, 20000)
 
-                t3 = time_ntp2py(data[4:12])
-                t2 = time_ntp2py(data[16:24])
-                t1 = time_ntp2py(data[28:36])
+        self.classes = classes
+        self.count = count
+        self.interval = float(interval) / 1000
+        self.output = output
+        self.host = hostStatistics(overhead_threshold)
+        self.senders = []
+        try:
+            for i, (label, tos) in enumerate(classes):
+                # port 0: every class gets its own ephemeral port
+                port = spt + i if spt else 0
+                local = "[%s]:%d" % (sip, port) if sipv == 6 else "%s:%d" % (sip, port)
+                sender = SessionSender(local, far_end, count, interval, tos, ttl, padding, do_not_fragment, crypto, output=output, sinks=sinks)
+                sender.host = self.host
+                self.senders.append(sender)
+        except Exception:
+            # e.g. a port of a later class in use: release the ones bound so far
+            for sender in self.senders:
+                sender.socket.close()
+            raise
+        self.running = True
 
-                delayRT = max(0, 1000 * (t4 - t1 + t2 - t3))  # round-trip delay
-                delayOB = max(0, 1000 * (t2 - t1))            # out-bound delay
-                delayIB = max(0, 1000 * (t4 - t3))            # in-bound delay
+    def run(self):
+        try:
+            self.measure()
+        finally:
+            for sender in self.senders:
+                sender.socket.close()
 
-                rseq = struct.unpack('!I', data[0:4])[0]
-                sseq = struct.unpack('!I', data[24:28])[0]
+    def measure(self):
+        senders = dict((sender.socket, sender) for sender in self.senders)
+        sockets = list(senders)
+        pending = set(self.senders)
 
-                logger.info("Reply from %s [rseq=%d sseq=%d rtt=%.2fms outbound=%.2fms inbound=%.2fms]", address[0], rseq, sseq, delayRT, delayOB, delayIB)
-                self.stats.add(delayRT, delayOB, delayIB, rseq, sseq)
+        schedule = now()
+        endtime = schedule + self.count * self.interval + 5
 
-                if sseq + 1 == self.count:
-                    logger.info("All packets received back")
-                    self.running = False
+        idx = 0
+        wakeup = now()
+        while self.running and pending:
+            ready = select.select(sockets, [], [], 0)[0]
+            while ready:
+                for sock in ready:
+                    if senders[sock].receive(wakeup):
+                        pending.discard(senders[sock])
+                ready = select.select(sockets, [], [], 0)[0]
 
             t1 = now()
             if (t1 >= schedule) and (idx < self.count):
+                self.host.lateness.add(1000 * (t1 - schedule))
                 schedule = schedule + self.interval
-
-                data = struct.pack('!L2IH', idx, int(TIMEOFFSET + t1), int((t1 - int(t1)) * ALLBITS), 0x3fff)
-                pbytes = generate_zero_bytes(self.padmix[int(len(self.padmix) * random.random())])
-
-                self.sendto(data + pbytes, (self.remote_addr, self.remote_port))
-                logger.info("Sent to %s [sseq=%d]", self.remote_addr, idx)
-
+                for sender in self.senders:
+                    sender.transmit(idx, now())
                 idx = idx + 1
-                if schedule > t1:
-                    # TODO: Do something with r, w, e
-                    r, w, e = select.select([self.socket], [], [], schedule - t1)
 
             if (t1 > endtime):
                 logger.info("Receive timeout for last packet (don't wait anymore)")
-                self.running = False
-
-        self.stats.dump(idx)
\ No newline at end of file
+                break
+
+            t = now()
+            self.host.loop.add(1000 * (t - wakeup))
+            timeout = schedule - t if idx < self.count else min(0.1, endtime - t)
+            if self.running and pending and timeout > 0:
+                select.select(sockets, [], [], timeout)
+            wakeup = now()
+
+        dump_classes([(label, sender.tos, sender.stats) for (label, _), sender in zip(self.classes, self.senders)], idx, self.output)
+        self.host.dump(self.output)
+        for sender in self.senders:
+            sender.report(idx)
+
+    def stop(self, signum, frame):
+        logger.info("SIGINT received: Stop TWL sessions")
+        self.running = False
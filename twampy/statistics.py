@@ -1,4 +1,6 @@
 import click
+import functools
+import math
 
 from twampy.utils import format_time
 
@@ -66,38 +68,212 @@ class twampStatistics:
 
         self.count += 1
 
-    def dump(self, total):
-        click.echo(
+    def summary(self, total):
+        """ statistics as a flat dict (delays in msec, loss in percent) """
+        record = {"sent": total, "received": self.count}
+        if self.count > 0 and total > 0:
+            self.lossRT = total - self.count
+            for name, direction in (("outbound", "OB"), ("inbound", "IB"), ("roundtrip", "RT")):
+                record[name + "_min"] = getattr(self, "min" + direction)
+                record[name + "_max"] = getattr(self, "max" + direction)
+                record[name + "_avg"] = getattr(self, "sum" + direction) / self.count
+                record[name + "_jitter"] = getattr(self, "jitter" + direction)
+                record[name + "_loss"] = 100 * float(getattr(self, "loss" + direction)) / total
+        return record
+
+    def dump(self, total, file=None):
+        echo = functools.partial(click.echo, file=file)
+        echo(
             "===============================================================================")
-        click.echo(
+        echo(
             "Direction         Min         Max         Avg          Jitter     Loss")
-        click.echo(
+        echo(
             "-------------------------------------------------------------------------------")
         if self.count > 0:
             self.lossRT = total - self.count
-            click.echo("  Outbound:    %s  %s  %s  %s    %5.1f%%" % (
+            echo("  Outbound:    %s  %s  %s  %s    %5.1f%%" % (
                 format_time(self.minOB),
                 format_time(self.maxOB),
                 format_time(self.sumOB / self.count),
                 format_time(self.jitterOB),
                 100 * float(self.lossOB) / total))
-            click.echo("  Inbound:     %s  %s  %s  %s    %5.1f%%" % (
+            echo("  Inbound:     %s  %s  %s  %s    %5.1f%%" % (
                 format_time(self.minIB),
                 format_time(self.maxIB),
                 format_time(self.sumIB / self.count),
                 format_time(self.jitterIB),
                 100 * float(self.lossIB) / total))
-            click.echo("  Roundtrip:   %s  %s  %s  %s    %5.1f%%" % (
+            echo("  Roundtrip:   %s  %s  %s  %s    %5.1f%%" % (
                 format_time(self.minRT),
                 format_time(self.maxRT),
                 format_time(self.sumRT / self.count),
                 format_time(self.jitterRT),
                 100 * float(self.lossRT) / total))
         else:
-            click.echo("  NO STATS AVAILABLE (100% loss)", err=True)
-        click.echo(
+            echo("  NO STATS AVAILABLE (100% loss)", err=True)
+        echo(
             "-------------------------------------------------------------------------------")
-        click.echo(
+        echo(
             "                                                    Jitter Algorithm [RFC1889]")
-        click.echo(
+        echo(
+            "===============================================================================")
+
+
+class twampHistogram:
+    """
+    Log-linear histogram of durations, cheap enough to be updated for every
+    packet: values below 8usec are counted exactly, above that every power
+    of two is split into SUB buckets, so a bucket spans at most 1/SUB of its
+    lower edge. Percentiles are interpolated within their bucket.
+    """
+
+    SUB = 8
+    SHIFT = 3          # log2(SUB)
+    LIMIT = 1 << 31    # usec, larger values are counted in the last bucket
+    BUCKETS = SUB + (31 - SHIFT) * SUB
+
+    def __init__(self):
+        self.buckets = [0] * self.BUCKETS
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    @classmethod
+    def index(cls, us):
+        us = min(us, cls.LIMIT - 1)
+        if us < cls.SUB:
+            return us
+        shift = us.bit_length() - 1 - cls.SHIFT
+        return cls.SUB + shift * cls.SUB + ((us >> shift) & (cls.SUB - 1))
+
+    @classmethod
+    def edges(cls, i):
+        """ lower and upper bound (usec) of bucket i """
+        if i < cls.SUB:
+            return i, i + 1
+        shift, sub = divmod(i - cls.SUB, cls.SUB)
+        return (cls.SUB + sub) << shift, (cls.SUB + sub + 1) << shift
+
+    def add(self, ms):
+        us = int(ms * 1000) if ms > 0 else 0
+        self.buckets[self.index(us)] += 1
+        self.count += 1
+        self.sum += ms
+        if ms > self.max:
+            self.max = ms
+
+    def bucket(self, p):
+        """ (bucket index, rank within the bucket) of the p-th percentile """
+        rank = max(1, math.ceil(p * self.count / 100.0))
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            if seen + n >= rank:
+                return i, rank - seen
+            seen += n
+        return self.BUCKETS - 1, 0
+
+    def percentile(self, p):
+        """ p-th percentile (msec), interpolated within its bucket """
+        if self.count == 0:
+            return 0.0
+        if p >= 100:
+            return self.max
+        i, rank = self.bucket(p)
+        lower, upper = self.edges(i)
+        us = lower + (upper - lower) * (rank - 0.5) / self.buckets[i]
+        return min(us / 1000, self.max)
+
+    def lower_bound(self, p):
+        """ msec the p-th percentile is known to reach: the lower edge of its bucket """
+        if self.count == 0:
+            return 0.0
+        return float(self.edges(self.bucket(p)[0])[0]) / 1000
+
+
+class hostStatistics:
+    """
+    Errors the measuring host adds on its own, kept apart from the network
+    delay: how late packets leave compared with their schedule, how long
+    received packets wait before being timestamped and how long one loop
+    iteration takes. A run is flagged unreliable as soon as the 99th
+    percentile of any of them is known to exceed 'threshold' msec: the
+    lower edge of its histogram bucket is compared, so bucketing never
+    flags a run by itself (P99 values less than 1/8 above the threshold
+    may go unflagged).
+    """
+
+    def __init__(self, threshold=1.0):
+        self.threshold = threshold
+        self.lateness = twampHistogram()
+        self.rxwait = twampHistogram()
+        self.loop = twampHistogram()
+
+    def histograms(self):
+        return (("Send lateness", "send_lateness", self.lateness),
+                ("Receive wait", "receive_wait", self.rxwait),
+                ("Loop iteration", "loop", self.loop))
+
+    def unreliable(self):
+        return any(hist.lower_bound(99) > self.threshold for _, _, hist in self.histograms())
+
+    def summary(self):
+        record = {"unreliable": self.unreliable()}
+        for _, name, hist in self.histograms():
+            record[name + "_p99"] = hist.percentile(99)
+        return record
+
+    def dump(self, file=None):
+        echo = functools.partial(click.echo, file=file)
+        echo(
+            "Host overhead          Avg         P50         P99         Max    Samples")
+        echo(
+            "-------------------------------------------------------------------------------")
+        for label, _, hist in self.histograms():
+            if hist.count == 0:
+                continue
+            echo("  %-15s%s  %s  %s  %s  %9d" % (
+                label + ":",
+                format_time(hist.sum / hist.count),
+                format_time(hist.percentile(50)),
+                format_time(hist.percentile(99)),
+                format_time(hist.max),
+                hist.count))
+        if self.unreliable():
+            echo("  UNRELIABLE: host overhead above %s (P99), delays include host error" % format_time(self.threshold).strip(), err=True)
+        echo(
             "===============================================================================")
+
+
+def dump_classes(rows, total, file=None):
+    """
+    Side-by-side statistics of several traffic classes measured in the
+    same run; 'rows' holds (label, tos, twampStatistics) tuples
+    """
+    echo = functools.partial(click.echo, file=file)
+    echo(
+        "===============================================================================")
+    echo(
+        "Class     TOS   Outbound    Inbound  Roundtrip     RT Max  RT Jitter    Loss")
+    echo(
+        "                     Avg        Avg        Avg")
+    echo(
+        "-------------------------------------------------------------------------------")
+    for label, tos, stats in rows:
+        if stats.count == 0:
+            echo("  %-6s 0x%02x  NO STATS AVAILABLE (100%% loss)" % (label, tos))
+            continue
+        echo("  %-6s 0x%02x %s %s %s %s %s  %5.1f%%" % (
+            label,
+            tos,
+            format_time(stats.sumOB / stats.count),
+            format_time(stats.sumIB / stats.count),
+            format_time(stats.sumRT / stats.count),
+            format_time(stats.maxRT),
+            format_time(stats.jitterRT),
+            100 * float(total - stats.count) / total if total else 100.0))
+    echo(
+        "-------------------------------------------------------------------------------")
+    echo(
+        "                                                    Jitter Algorithm [RFC1889]")
+    echo(
+        "===============================================================================")